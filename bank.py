@@ -0,0 +1,194 @@
+"""
+Pregenerated problem bank.
+
+    python bank.py -n 500 -o problems.bank
+
+writes N problems per circuit type (parameters, SVG and answer key) to one
+indexed binary file. The app memory-maps it at startup, so drawing a problem is
+an index lookup with no rendering, and every Streamlit worker process on the
+machine shares the same pages.
+
+Layout: a header, then a table of (record offset, count) per circuit type, then
+fixed-size records sorted by seed within each type, then the SVG bytes.
+"""
+import argparse
+import mmap
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from engine import CIRCUIT_TYPES, TRANSFER_CIRCUITS, CircuitDrawer, Problem, generate_problem, solve_problem, table_vins
+
+MAGIC = b'ELECBANK'
+VERSION = 2  # 2: clipper/clamper answers from the nodal solver
+ANSWER_SLOTS = 9  # Widest answer key is zener_diode3's nine values
+
+HEADER = np.dtype([('magic', 'S8'), ('version', '<u4'), ('types', '<u4')])
+SECTION = np.dtype([('offset', '<u8'), ('count', '<u8')])
+RECORD = np.dtype([
+    ('seed', '<u8'),
+    ('problem', f'V{Problem._PACKED.size}'),
+    ('answers', '<f8', (ANSWER_SLOTS,)),
+    ('forward_bias', 'u1'),  # Bit i is the diode state for table row i
+    ('svg_offset', '<u8'),
+    ('svg_length', '<u4'),
+])
+
+
+def _build_entries(circuit_type, seeds):
+    """Worker-process job: generate, draw and solve one chunk of problems"""
+    drawer = CircuitDrawer()
+    entries = []
+    for seed in seeds:
+        problem = generate_problem(circuit_type, seed)
+        answers = np.full(ANSWER_SLOTS, np.nan)
+        forward_bias = 0
+        if circuit_type in TRANSFER_CIRCUITS:
+            _, fb, vo = solve_problem(problem)
+            answers[:len(vo)] = vo
+            forward_bias = sum(1 << i for i, on in enumerate(fb) if on)
+        else:
+            values = solve_problem(problem)[1:]
+            answers[:len(values)] = values
+        entries.append((seed, problem.to_bytes(), answers, forward_bias, drawer.draw_problem(problem)))
+    return circuit_type, entries
+
+
+def build_bank(path, per_type, workers=None, seed=None, chunk_size=250):
+    """Generate `per_type` problems for every circuit type in parallel and write the bank to `path`"""
+    rng = random.Random(seed)
+    jobs = []
+    for circuit_type in CIRCUIT_TYPES:
+        seeds = sorted({rng.getrandbits(64) for _ in range(per_type)})
+        for start in range(0, len(seeds), chunk_size):
+            jobs.append((circuit_type, seeds[start:start + chunk_size]))
+
+    entries = {circuit_type: [] for circuit_type in CIRCUIT_TYPES}
+    with ProcessPoolExecutor(workers) as pool:
+        for circuit_type, chunk in pool.map(_build_entries, *zip(*jobs)):
+            entries[circuit_type].extend(chunk)
+
+    total = sum(len(chunk) for chunk in entries.values())
+    records = np.zeros(total, dtype=RECORD)
+    sections = np.zeros(len(CIRCUIT_TYPES), dtype=SECTION)
+    records_start = HEADER.itemsize + sections.nbytes
+    svg_start = records_start + records.nbytes
+
+    blobs = []
+    svg_offset = svg_start
+    i = 0
+    for t, circuit_type in enumerate(CIRCUIT_TYPES):
+        sections[t] = (records_start + i * RECORD.itemsize, len(entries[circuit_type]))
+        for seed_value, problem, answers, forward_bias, svg in entries[circuit_type]:
+            records[i] = (seed_value, problem, answers, forward_bias, svg_offset, len(svg))
+            blobs.append(svg)
+            svg_offset += len(svg)
+            i += 1
+
+    header = np.array([(MAGIC, VERSION, len(CIRCUIT_TYPES))], dtype=HEADER)
+    with open(path, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(sections.tobytes())
+        f.write(records.tobytes())
+        for svg in blobs:
+            f.write(svg)
+    return total
+
+
+class ProblemBank:
+    """
+    Read-only view of a bank file. The records are numpy views straight onto
+    the memory map, so opening a bank copies nothing and lookups are O(1) by
+    position or O(log n) by seed.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = np.frombuffer(self._map, dtype=HEADER, count=1)[0]
+        if header['magic'] != MAGIC or header['version'] != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} problem bank")
+        if header['types'] != len(CIRCUIT_TYPES):
+            raise ValueError(f"{path} was built for a different set of circuit types")
+
+        sections = np.frombuffer(self._map, dtype=SECTION, count=len(CIRCUIT_TYPES), offset=HEADER.itemsize)
+        self._records = {
+            circuit_type: np.frombuffer(self._map, dtype=RECORD, count=int(count), offset=int(offset))
+            for circuit_type, (offset, count) in zip(CIRCUIT_TYPES, sections.tolist())
+        }
+
+    def __len__(self):
+        return sum(len(records) for records in self._records.values())
+
+    def count(self, circuit_type):
+        return len(self._records[circuit_type])
+
+    def random_problem(self, circuit_type, rng=random):
+        """A uniformly chosen problem of `circuit_type`, or None if the bank has none"""
+        records = self._records[circuit_type]
+        if not len(records):
+            return None
+        return Problem.from_bytes(records[rng.randrange(len(records))]['problem'].tobytes())
+
+    def _find(self, problem):
+        records = self._records.get(problem.circuit_type)
+        if records is None or problem.seed is None:
+            return None
+        i = int(np.searchsorted(records['seed'], problem.seed))
+        # The whole problem must match: if generate_problem has changed since the
+        # bank was built, the same seed gives other numbers than the stored drawing
+        if i < len(records) and records[i]['seed'] == problem.seed:
+            if records[i]['problem'].tobytes() == problem.to_bytes():
+                return records[i]
+        return None
+
+    def svg(self, problem):
+        """Pregenerated SVG for a problem, or None if it did not come from this bank"""
+        record = self._find(problem)
+        if record is None:
+            return None
+        start = int(record['svg_offset'])
+        return self._map[start:start + int(record['svg_length'])]
+
+    def answers(self, problem):
+        """
+        Stored answer key in solve_problem's layout: (vins, forward_bias, vo) for
+        clippers and clampers, calculate_correct_values' tuple for the Zener circuits.
+        """
+        record = self._find(problem)
+        if record is None:
+            return None
+        answers = record['answers']
+        if problem.circuit_type in TRANSFER_CIRCUITS:
+            vins = table_vins(problem.vin_peak)
+            forward_bias = np.array([bool(int(record['forward_bias']) >> i & 1) for i in range(len(vins))])
+            return vins, forward_bias, answers[:len(vins)].copy()
+        values = answers[~np.isnan(answers)].tolist()
+        return (True, *values)
+
+    def close(self):
+        self._records = {}
+        self._map.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pregenerate an Electra problem bank")
+    parser.add_argument('-n', '--per-type', type=int, default=500, help="problems per circuit type")
+    parser.add_argument('-o', '--output', default='problems.bank', help="bank file to write")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--seed', type=int, default=None, help="master seed, for a reproducible bank")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    total = build_bank(args.output, args.per_type, args.workers, args.seed)
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(args.output)
+    print(f"Wrote {total} problems to {args.output} ({size / 1024:.0f} KiB) in {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+Benchmarks for the draw, solve, format and rerun paths.
+
+    python bench.py --json results.json
+    python bench.py --json new.json --compare results.json
+
+Every case reports p50/p95/p99 latency and the median bytes allocated per
+call (traced in a separate pass so tracing doesn't skew the timings). With
+--compare, cases whose p50 got slower than --threshold times the baseline are
+listed and the exit status is 1, so it can gate a deploy.
+"""
+import argparse
+import base64
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from engine import (
+    CIRCUIT_TYPES, DIODE_MODELS, TRANSFER_CIRCUITS, WAVEFORM_POINTS, WAVEFORM_SAMPLES, CircuitDrawer,
+    calculate_correct_values, calculate_correct_values_batch, circuit_solver, generate_problem, lttb,
+    simulate_clamper, table_vins, waveform
+)
+from main import NAV_BUTTONS
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+# Built from the page's own buttons so the benchmarks can't drift from it
+NAV_LABELS = {circuit_type: label for group in NAV_BUTTONS for label, circuit_type in group}
+
+
+def measure(fn, repeat, warmup=3, alloc_repeat=20):
+    """Time `repeat` calls of fn and trace allocations over `alloc_repeat` more"""
+    for _ in range(warmup):
+        fn()
+
+    times = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter_ns()
+        fn()
+        times[i] = time.perf_counter_ns() - start
+
+    allocated = []
+    tracemalloc.start()
+    try:
+        for _ in range(min(alloc_repeat, repeat)):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            fn()
+            allocated.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(times / 1000, [50, 95, 99])
+    return {
+        'n': repeat,
+        'p50_us': round(float(p50), 3),
+        'p95_us': round(float(p95), 3),
+        'p99_us': round(float(p99), 3),
+        'alloc_bytes': int(np.median(allocated)),
+    }
+
+
+def draw_cases(rng):
+    drawer = CircuitDrawer()
+    for circuit_type in CIRCUIT_TYPES:
+        problem = generate_problem(circuit_type, rng.getrandbits(64))
+        key = drawer.template_key(problem)
+        # Cold: the schemdraw layout a first-seen topology pays for
+        yield f'draw.layout.{circuit_type}', lambda key=key: drawer.render_skeleton(key), 0.2
+        # Warm: filling the cached template
+        yield f'draw.fill.{circuit_type}', lambda problem=problem: drawer.draw_problem(problem), 1
+
+
+def solve_cases():
+    vin_peak, vbias = 12.3, 4.5
+    vins = table_vins(vin_peak)
+    for circuit_type in TRANSFER_CIRCUITS:
+        biased = circuit_type in ('series_biasclipper', 'parallel_biasclipper', 'bias_clamper')
+        for diode_reversed, vbias_reversed in itertools.product((False, True), (False, True) if biased else (None,)):
+            branch = f"{'rev' if diode_reversed else 'fwd'}{'' if vbias_reversed is None else '_rev' if vbias_reversed else '_fwd'}"
+            args = (diode_reversed, circuit_type, vbias if biased else None, vbias_reversed, vin_peak)
+            yield (
+                f'solve.scalar.{circuit_type}.{branch}',
+                lambda args=args: [calculate_correct_values(vin, *args) for vin in vins], 1
+            )
+            yield f'solve.batch.{circuit_type}.{branch}', lambda args=args: calculate_correct_values_batch(vins, *args), 1
+
+    # The nodal solver on its own: a 10k-point sweep over already factorized states
+    sweep = np.linspace(-vin_peak, vin_peak, 10_000)
+    solver = circuit_solver('parallel_biasclipper', False, True, False)
+    yield 'solve.nodal.sweep', lambda: solver.solve(vin=sweep, vbias=vbias), 1
+
+    # Practical diodes: a graded table and a plotted 10k-point transfer curve
+    for name, model in DIODE_MODELS.items():
+        if model is None:
+            continue
+        args = (False, 'parallel_biasclipper', vbias, False, vin_peak)
+        yield f'solve.{name}.table', lambda args=args, model=model: calculate_correct_values_batch(
+            vins, *args, diode_model=model, r_value=2.2
+        ), 1
+        yield f'solve.{name}.sweep', lambda args=args, model=model: calculate_correct_values_batch(
+            sweep, *args, diode_model=model, r_value=2.2
+        ), 0.2
+
+    # Waveform panel: the full bulk solve plus decimation, uncached
+    for circuit_type in ('parallel_biasclipper', 'bias_clamper'):
+        problem = generate_problem(circuit_type, 1)
+        yield f'solve.waveform.{circuit_type}', lambda p=problem: waveform.__wrapped__(p), 0.2
+    t = np.linspace(0, 1, WAVEFORM_SAMPLES)
+    curve = np.sin(2 * np.pi * t)
+    yield 'solve.waveform.lttb', lambda: lttb(t, curve, WAVEFORM_POINTS), 0.2
+    # Transient clamper: 500 cycles at 500 samples each, fast and slow RC
+    problem = generate_problem('bias_clamper', 1)
+    for name, capacitance in (('slow', 100.0), ('fast', 0.01)):
+        yield f'solve.transient.{name}', lambda c=capacitance: simulate_clamper(
+            problem, c, 1000.0, cycles=500, samples=250_000
+        ), 0.2
+
+    for circuit_type in ('zener_diode1', 'zener_diode2', 'zener_diode3'):
+        problem = generate_problem(circuit_type, 1)
+        yield f'solve.scalar.{circuit_type}', lambda p=problem: calculate_correct_values(
+            p.vin_peak, p.diode_reversed, p.circuit_type, vin_peak=p.vin_peak, vz=p.vz,
+            iz_max=p.iz_max, iz_min=p.iz_min, r_value=p.r_value
+        ), 1
+
+
+def format_cases(rng):
+    from main import parse_engineering_notation, to_engineering_notation, to_engineering_notation_array
+    values = [rng.choice([-1, 1]) * 10 ** rng.uniform(-10, 10) for _ in range(100)] + [0, 1, 1000, 0.5]
+    yield 'format.to_engineering_notation', lambda: [to_engineering_notation(v, 'V') for v in values], 1
+    # Uncached: the first time a value is formatted
+    uncached = to_engineering_notation.__wrapped__
+    yield 'format.to_engineering_notation.uncached', lambda: [uncached(v, 'V') for v in values], 1
+    array = np.array(values)
+    yield 'format.to_engineering_notation_array', lambda: to_engineering_notation_array(array, 'V'), 1
+    texts = [to_engineering_notation(v, 'V') for v in values if abs(v) > 1e-9]
+    yield 'format.parse_engineering_notation', lambda: [parse_engineering_notation(t, 'V') for t in texts], 1
+
+    svg = CircuitDrawer().draw_problem(generate_problem('bias_clamper', 1))
+    yield 'format.base64_svg', lambda: base64.b64encode(svg).decode(), 1
+
+
+def rerun_cases():
+    from streamlit.testing.v1 import AppTest
+
+    for circuit_type in CIRCUIT_TYPES:
+        at = AppTest.from_file(APP_PATH, default_timeout=60)
+        at.run()
+        next(b for b in at.button if b.label == NAV_LABELS[circuit_type]).click()
+        at.run()
+        # A plain rerun of a page showing a problem, like any widget interaction
+        yield f'rerun.{circuit_type}', at.run, 0.05
+
+
+def run(repeat, selected, include_rerun):
+    rng = random.Random(0)
+    groups = [draw_cases(rng), solve_cases(), format_cases(rng)]
+    if include_rerun:
+        groups.append(rerun_cases())
+
+    results = {}
+    for name, fn, scale in itertools.chain(*groups):
+        if selected and not any(s in name for s in selected):
+            continue
+        results[name] = measure(fn, max(5, int(repeat * scale)))
+        r = results[name]
+        print(f"{name:55s} p50 {r['p50_us']:>10.1f}us  p95 {r['p95_us']:>10.1f}us  "
+              f"p99 {r['p99_us']:>10.1f}us  alloc {r['alloc_bytes'] / 1024:>8.1f}KiB")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Names of cases whose p50 regressed past `threshold` x the baseline"""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base and r['p50_us'] > threshold * base['p50_us']:
+            regressions.append(name)
+            print(f"REGRESSION {name}: p50 {base['p50_us']:.1f}us -> {r['p50_us']:.1f}us")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Electra's draw, solve, format and rerun paths")
+    parser.add_argument('-n', '--repeat', type=int, default=500, help="timed calls per case (scaled down for slow cases)")
+    parser.add_argument('-k', '--filter', action='append', default=[], help="only run cases containing this text")
+    parser.add_argument('--no-rerun', action='store_true', help="skip the full-page AppTest reruns")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--compare', help="baseline JSON from an earlier run")
+    parser.add_argument('--threshold', type=float, default=1.25, help="p50 slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.filter, not args.no_rerun)
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
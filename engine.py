@@ -0,0 +1,1329 @@
+"""
+Problem generation, drawing and solving for the Electra circuits.
+Nothing here touches Streamlit, so it can run in worker processes, batch jobs
+and benchmarks as well as behind the app.
+"""
+import functools
+import gzip
+import hashlib
+import multiprocessing
+import multiprocessing.util
+import os
+import random
+import re
+import struct
+import tempfile
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from dataclasses import dataclass
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from netlist import OFF, DiodeModel, Element, NodalSolver, Part, Schematic
+
+try:
+    import brotli
+except ImportError:  # Optional: only used to precompress static SVGs
+    brotli = None
+
+
+RENDER_CACHE_SIZE = 64
+STATIC_SVG_LIMIT = 5000
+SVG_PRECISION = 1  # Decimal places kept in coordinates; 0.1pt is well below a pixel
+SOLVER_CACHE_SIZE = 256
+WAVEFORM_SAMPLES = 5000
+WAVEFORM_POINTS = 400  # Per curve, after decimation
+CLAMPER_CYCLES = 10  # Input periods the transient clamper waveform covers
+
+
+class SvgTemplate:
+    """
+    Circuit SVG pre-rendered with @slot@ markers where the numeric labels go.
+    The SVG is split around the markers once, so filling a template is a join
+    of static chunks and label text with no schemdraw involved.
+    """
+    SLOT_PATTERN = re.compile(rb'@(\w+)@')
+
+    def __init__(self, svg):
+        parts = self.SLOT_PATTERN.split(svg)
+        self.chunks = tuple(parts[0::2])
+        self.slots = tuple(name.decode() for name in parts[1::2])
+
+    def fill(self, **values):
+        missing = set(self.slots) - set(values)
+        if missing:
+            raise ValueError(f"Missing label values for slots: {', '.join(sorted(missing))}")
+
+        out = [self.chunks[0]]
+        for name, chunk in zip(self.slots, self.chunks[1:]):
+            out.append(escape(values[name]).encode())
+            out.append(chunk)
+        return b''.join(out)
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe LRU cache. Used for circuit templates keyed by
+    topology, so one render serves every problem that shares the same
+    circuit/diode/bias layout, and for the practical-diode solvers.
+    """
+    def __init__(self, maxsize=RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key, create):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        # Create outside the lock so a slow layout doesn't block cache hits
+        value = create()
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_render_cache = LRUCache()
+
+# schemdraw keeps the drawing being built in module-level state, so two
+# threads laying out circuits at once can add elements to each other's drawing
+_schemdraw_lock = threading.Lock()
+
+
+def get_render_cache():
+    """Process-wide render cache shared by every session"""
+    return _render_cache
+
+
+class SvgStore:
+    """
+    Content-addressed SVG files for Streamlit's static file server. Each drawing
+    is written once as <hash>.svg, so its URL never changes meaning: the browser
+    can keep it, and a rerun only has to send the short URL. Past `limit` files
+    the least recently published are deleted. Files are never touched once
+    written, since their mtime is the server's ETag and Last-Modified; last use
+    is tracked in memory instead. With `precompress`, .gz (and .br, if brotli is
+    installed) copies are written alongside for a proxy's gzip_static/brotli_static.
+    """
+    COMPRESSED_SUFFIXES = ('.gz', '.br')
+
+    def __init__(self, directory, url_prefix, limit=STATIC_SVG_LIMIT, precompress=False):
+        self.directory = directory
+        self.url_prefix = url_prefix.rstrip('/')
+        self.limit = limit
+        self.precompress = precompress
+        self._written = 0
+        self._last_used = {}  # name -> time this process last published it
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def digest(svg):
+        return hashlib.blake2b(svg, digest_size=12).hexdigest()
+
+    def publish(self, svg):
+        """URL of the stored copy of `svg`, writing it first if it is new"""
+        name = f'{self.digest(svg)}.svg'
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            self._last_used[name] = time.time()
+        # Checked on disk every time, since another process's prune may have deleted it
+        if not os.path.exists(path):
+            if self.precompress:
+                self._write(path + '.gz', gzip.compress(svg, 9, mtime=0))
+                if brotli is not None:
+                    self._write(path + '.br', brotli.compress(svg))
+            self._write(path, svg)
+            self._note_write()
+        return f'{self.url_prefix}/{name}'
+
+    def _write(self, path, data):
+        # Write to a temp file and rename, so the server never serves half a file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _note_write(self):
+        with self._lock:
+            self._written += 1
+            due = self._written >= max(1, self.limit // 10)
+            if due:
+                self._written = 0
+        if due:
+            self.prune()
+
+    def prune(self):
+        """Delete the least recently published SVGs beyond the limit"""
+        with self._lock:
+            last_used = dict(self._last_used)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.svg'):
+                try:
+                    # Other processes' use isn't seen here, only when they wrote the file
+                    entries.append((max(entry.stat().st_mtime, last_used.get(entry.name, 0)), entry.name))
+                except FileNotFoundError:
+                    pass
+        entries.sort()
+        removed = [name for _, name in entries[:max(0, len(entries) - self.limit)]]
+        for name in removed:
+            for suffix in ('',) + self.COMPRESSED_SUFFIXES:
+                try:
+                    os.remove(os.path.join(self.directory, name + suffix))
+                except FileNotFoundError:
+                    pass
+        kept = {name for _, name in entries}.difference(removed)
+        with self._lock:
+            for name in [name for name in self._last_used if name not in kept]:
+                del self._last_used[name]
+
+
+_SVG_ATTR = re.compile(rb'\s([\w:-]+)="([^"]*)"')
+_SVG_NUMBER = re.compile(rb'-?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?')
+_SVG_NUMERIC_ATTRS = {
+    b'd', b'points', b'x', b'y', b'dx', b'dy', b'cx', b'cy', b'r', b'rx', b'ry',
+    b'x1', b'y1', b'x2', b'y2', b'width', b'height', b'viewBox', b'transform', b'font-size',
+}
+_SVG_DROPPED_ATTRS = {b'xml:lang'}
+_SVG_NUMERIC_STYLES = {b'stroke-width', b'font-size', b'stroke-dasharray', b'stroke-dashoffset', b'stroke-miterlimit'}
+_SVG_DROPPED_STYLES = {b'stroke-dasharray:-'}  # Not valid CSS, so browsers ignore it anyway
+
+
+def _round_numbers(value, precision):
+    def fmt(match):
+        text = f'{round(float(match.group()), precision):.{precision}f}'.rstrip('0').rstrip('.')
+        return b'0' if text == '-0' else text.encode()
+    return _SVG_NUMBER.sub(fmt, value)
+
+
+def _round_style(rule, precision):
+    # Only lengths; colours like #1e90ff would be mangled
+    prop, _, value = rule.partition(b':')
+    if prop.strip() not in _SVG_NUMERIC_STYLES:
+        return rule
+    return prop + b':' + _round_numbers(value, precision)
+
+
+def minify_svg(svg, precision=SVG_PRECISION):
+    """
+    Shrink schemdraw's SVG output: round coordinates to `precision` decimals,
+    drop metadata and no-op styles, and move the inline style each element
+    repeats into one <style> block of classes. Text content (and so any @slot@
+    marker) is left alone.
+    """
+    classes = {}
+
+    def attr(match):
+        name, value = match.groups()
+        if name in _SVG_DROPPED_ATTRS:
+            return b''
+        if name in _SVG_NUMERIC_ATTRS:
+            return b' %s="%s"' % (name, _round_numbers(value, precision))
+        if name == b'style':
+            rules = [rule.strip() for rule in value.split(b';')]
+            style = b';'.join(
+                _round_style(rule, precision) for rule in rules if rule and rule not in _SVG_DROPPED_STYLES
+            )
+            if style not in classes:
+                classes[style] = b's%d' % len(classes)
+            return b' class="%s"' % classes[style]
+        return match.group()
+
+    body = _SVG_ATTR.sub(attr, svg)
+    body = re.sub(rb'<!--.*?-->|<metadata.*?</metadata>', b'', body, flags=re.S)
+    body = re.sub(rb'>\s+<', b'><', body).replace(b' />', b'/>').strip()
+    if b'xlink:' not in body.replace(b'xmlns:xlink=', b''):
+        body = re.sub(rb'\sxmlns:xlink="[^"]*"', b'', body, count=1)
+
+    if classes:
+        css = b''.join(b'.%s{%s}' % (name, style) for style, name in classes.items())
+        open_tag_end = body.index(b'>') + 1
+        body = body[:open_tag_end] + b'<style>' + css + b'</style>' + body[open_tag_end:]
+    return body
+
+
+@functools.lru_cache(maxsize=None)
+def _schemdraw():
+    """
+    schemdraw and its elements, imported on first layout rather than with this
+    module: the app process hands layouts to RenderService workers and a bank or
+    a warm cache can mean it never draws at all.
+    """
+    import schemdraw
+    import schemdraw.elements as elm
+    schemdraw.svgconfig.text = 'text'
+    return schemdraw, elm
+
+
+def _slot(name):
+    return f'@{name}@'
+
+
+class RenderBusy(RuntimeError):
+    """The render service has too many layouts queued to accept another"""
+
+
+class RenderTimeout(RenderBusy):
+    """A queued layout did not finish within the render service's timeout"""
+
+
+class RenderService:
+    """
+    Runs schemdraw layouts in a bounded pool of worker processes, so a burst of
+    first renders spreads across cores instead of serializing on the GIL and on
+    schemdraw's shared drawing state. At most `max_pending` layouts are queued;
+    past that, submit() waits up to `queue_timeout` seconds for a slot and then
+    raises RenderBusy, and render() gives up with RenderTimeout after
+    `render_timeout` seconds. Concurrent requests for the same topology share one job.
+    """
+    def __init__(self, workers=None, max_pending=None, queue_timeout=5.0, render_timeout=30.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.workers
+        self.queue_timeout = queue_timeout
+        self.render_timeout = render_timeout
+        # Streamlit runs scripts on threads, and forking a threaded process is unsafe
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        # A multiprocessing child joins its own children before atexit runs, so
+        # without this a process that owns a service would hang on exit
+        multiprocessing.util.Finalize(self, self.close, exitpriority=20)
+
+    def submit(self, key):
+        """Queue the skeleton layout for a topology key and return its future"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise RenderBusy(f"Render queue is full ({self.max_pending} pending)")
+
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._slots.release()
+                return future
+            try:
+                future = self._pool.submit(_render_skeleton, key)
+            except RuntimeError:
+                self._slots.release()
+                raise RenderBusy("Render service is shut down") from None
+            self._inflight[key] = future
+        future.add_done_callback(lambda _: self._finish(key))
+        return future
+
+    def render(self, key):
+        """Skeleton SVG for a topology key, blocking until a worker has drawn it"""
+        try:
+            return self.submit(key).result(timeout=self.render_timeout)
+        except FuturesTimeoutError:
+            raise RenderTimeout(f"Rendering {key} took longer than {self.render_timeout}s") from None
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)
+
+    def _finish(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+        self._slots.release()
+
+
+def _render_skeleton(key):
+    """Worker-process entry point for RenderService"""
+    return CircuitDrawer().render_skeleton(key)
+
+
+class CircuitDrawer:
+    def __init__(self, render_service=None):
+        self.render_service = render_service
+        self.circuit_functions = {
+            'series_clipper': self.series_clipper,
+            'series_biasclipper': self.series_biasclipper,
+            'parallel_clipper': self.parallel_clipper,
+            'parallel_biasclipper': self.parallel_biasclipper,
+            'nobias_clamper': self.nobias_clamper,
+            'bias_clamper': self.bias_clamper,
+            'zener_diode1': self.zener_diode1,
+            'zener_diode2': self.zener_diode2,
+            'zener_diode3': self.zener_diode3
+        }
+
+    def draw_circuit(self, circuit_type, *args):
+        if circuit_type in self.circuit_functions:
+            return self.circuit_functions[circuit_type](*args)
+        else:
+            raise ValueError(f"Unknown circuit type: {circuit_type}")
+
+    @staticmethod
+    def topologies():
+        """Every template key the drawer can produce: (layout, *builder flags)"""
+        keys = []
+        for layout in ('clipper', 'parallel_clipper', 'clamper'):
+            for diode_reversed in (False, True):
+                keys.append((layout, diode_reversed, False, False))
+                keys.append((layout, diode_reversed, True, False))
+                keys.append((layout, diode_reversed, True, True))
+        for layout in ('zener_diode1', 'zener_diode2', 'zener_diode3'):
+            for diode_reversed in (False, True):
+                keys.append((layout, diode_reversed))
+        return keys
+
+    @staticmethod
+    def template_key(problem):
+        """Topology key of the template draw_problem fills for `problem`"""
+        return topology_key(problem.circuit_type, problem.diode_reversed, problem.vbias is not None, problem.vbias_reversed)
+
+    def render_skeleton(self, key):
+        """Run schemdraw for a topology key and return the SVG with its @slot@ markers"""
+        with _schemdraw_lock:
+            svg = draw_schematic(schematic(key))
+        return minify_svg(svg)
+
+    def template(self, key):
+        """
+        Template for a topology key, running schemdraw only the first time its
+        schematic is seen. Templates are cached by the schematic's topology hash,
+        so keys that draw the same circuit share one layout. With a
+        render_service the layout runs in a worker process and may raise
+        RenderBusy under load.
+        """
+        if self.render_service is not None:
+            render = lambda: SvgTemplate(self.render_service.render(key))
+        else:
+            render = lambda: SvgTemplate(self.render_skeleton(key))
+        return get_render_cache().get_or_create(schematic(key).topology_hash(), render)
+
+    def prerender_templates(self):
+        """Render every topology up front so no request ever waits on schemdraw"""
+        if self.render_service is not None:
+            # Queue every layout first so the workers draw them in parallel
+            for key in self.topologies():
+                try:
+                    self.render_service.submit(key)
+                except RenderBusy:
+                    break
+        for key in self.topologies():
+            self.template(key)
+
+    def _render(self, key, **labels):
+        return self.template(key).fill(**labels)
+
+    def draw_problem(self, problem):
+        """Render the SVG for a generated Problem"""
+        return self.draw_circuit(
+            problem.circuit_type, problem.vin_peak, problem.diode_reversed, problem.r_value,
+            problem.vbias, problem.vbias_reversed, problem.vz
+        )
+
+    def series_clipper(self, vin_peak, diode_reversed, r_value, vbias=None, vbias_reversed=None, vz=None):
+        return self._draw_clipper(vin_peak, diode_reversed, None, None)
+
+    def series_biasclipper(self, vin_peak, diode_reversed, r_value, vbias=None, vbias_reversed=None, vz=None):
+        return self._draw_clipper(vin_peak, diode_reversed, vbias, vbias_reversed)
+
+    def parallel_clipper(self, vin_peak, diode_reversed, r_value, vbias=None, vbias_reversed=None, vz=None):
+        return self._draw_parallel_clipper(vin_peak, diode_reversed, r_value, None, None)
+
+    def parallel_biasclipper(self, vin_peak, diode_reversed, r_value, vbias=None, vbias_reversed=None, vz=None):
+        return self._draw_parallel_clipper(vin_peak, diode_reversed, r_value, vbias, vbias_reversed)
+
+    def nobias_clamper(self, vin_peak, diode_reversed, r_value, vbias=None, vbias_reversed=None, vz=None):
+        return self._draw_clamper(vin_peak, diode_reversed, None, None)
+
+    def bias_clamper(self, vin_peak, diode_reversed, r_value, vbias=None, vbias_reversed=None, vz=None):
+        return self._draw_clamper(vin_peak, diode_reversed, vbias, vbias_reversed)
+
+    def zener_diode1(self, vin_peak, diode_reversed, r_value, vbias=None, vbias_reversed=None, vz=None):
+        return self._render(
+            ('zener_diode1', diode_reversed),
+            vin=f'{vin_peak:.1f}', r=f'{r_value:.3f}', vz=f'{vz:.1f}'
+        )
+
+    def zener_diode2(self, vin_peak, diode_reversed, r_value, vbias=None, vbias_reversed=None, vz=None):
+        r1_value, r2_value = r_value
+        return self._render(
+            ('zener_diode2', diode_reversed),
+            r1=f'{r1_value:.3f}', r2=f'{r2_value:.3f}', vz=f'{vz:.1f}'
+        )
+
+    def zener_diode3(self, vin_peak, diode_reversed, r_value, vbias=None, vbias_reversed=None, vz=None):
+        return self._render(
+            ('zener_diode3', diode_reversed),
+            vin=f'{vin_peak:.1f}', r1=f'{r_value:.3f}', vz=f'{vz:.1f}'
+        )
+
+    def _draw_clipper(self, vin_peak, diode_reversed, vbias, vbias_reversed):
+        biased = vbias is not None
+        return self._render(
+            ('clipper', diode_reversed, biased, biased and bool(vbias_reversed)),
+            vin=f'{vin_peak:.1f}', vbias=f'{vbias:.1f}' if biased else ''
+        )
+
+    def _draw_parallel_clipper(self, vin_peak, diode_reversed, r_value, vbias, vbias_reversed):
+        biased = vbias is not None
+        return self._render(
+            ('parallel_clipper', diode_reversed, biased, biased and bool(vbias_reversed)),
+            vin=f'{vin_peak:.1f}', r=f'{r_value:.3f}', vbias=f'{vbias:.1f}' if biased else ''
+        )
+
+    def _draw_clamper(self, vin_peak, diode_reversed, vbias, vbias_reversed):
+        biased = vbias is not None
+        return self._render(
+            ('clamper', diode_reversed, biased, biased and bool(vbias_reversed)),
+            vin=f'{vin_peak:.1f}', vbias=f'{vbias:.1f}' if biased else ''
+        )
+
+
+# Schematics -------------
+# One declarative Schematic per topology key drives both the drawing and the
+# solver. Labels are drawn as @slot@ markers and substituted per problem.
+# Resistor values are placeholders: the clipper and clamper answers don't depend
+# on R, and the Zener answers come from calculate_correct_values.
+
+def _diode(start, end, reversed, kind='D', name='D', value=None):
+    """Diode drawn from start to end, anode first unless reversed"""
+    return Element(kind, name, end, start, value) if reversed else Element(kind, name, start, end, value)
+
+
+def _battery(start, end, reversed):
+    """Bias battery drawn from start to end, + first unless reversed"""
+    return Element('V', 'Vbias', end, start, 'vbias') if reversed else Element('V', 'Vbias', start, end, 'vbias')
+
+
+def _source(label, value='vin'):
+    return Part('SourceV', 'up', label, element=Element('V', 'Vin', 'in', '0', value))
+
+
+def _output(biased):
+    """Open output terminal and its +/- Vo marker"""
+    if biased:
+        gaps = [Part('Gap', 'down', ('+', '', '$V_o$')), Part('Gap', 'down', ('-'))]
+    else:
+        gaps = [Part('Gap', 'down', ('+', '$V_o$', '-'))]
+    return [Part('push'), Part('Line', dot=True)] + gaps + [Part('pop')]
+
+
+def _clipper_schematic(diode_reversed, biased, vbias_reversed):
+    parts = [_source(f'Vin={_slot("vin")} V')]
+    top = 'in'
+    if biased:
+        parts.append(Part('Battery', 'right', f'{_slot("vbias")} V', 'bottom', vbias_reversed, element=_battery('in', 'b', vbias_reversed)))
+        top = 'b'
+    parts.append(Part('Diode', 'right', flip=diode_reversed, element=_diode(top, 'out', diode_reversed)))
+    parts += [Part('push'), Part('Line', dot=True), Part('Gap', 'down', ('+', '$V_o$', '-')), Part('pop')]
+    parts += [
+        Part('Resistor', 'down', element=Element('R', 'R', 'out', '0', 1.0)),
+        Part('Line', 'right', dot=True, hold=True),
+        Part('Line', 'left'),
+    ]
+    if biased:
+        parts.append(Part('Line'))
+    return Schematic(tuple(parts))
+
+
+def _parallel_clipper_schematic(diode_reversed, biased, vbias_reversed):
+    parts = [
+        _source(f'Vin={_slot("vin")} V'),
+        Part('Line', 'right'),
+        Part('Resistor', label=f'R={_slot("r")} kΩ', element=Element('R', 'R', 'in', 'out', 1.0)),
+    ]
+    parts += _output(biased)
+    bottom = 'b' if biased else '0'
+    parts.append(Part('Diode', 'down', flip=diode_reversed, element=_diode('out', bottom, diode_reversed)))
+    if biased:
+        parts.append(Part('Battery', label=f'{_slot("vbias")} V', loc='bottom', flip=vbias_reversed, element=_battery('b', '0', vbias_reversed)))
+    parts += [Part('Line', 'right', dot=True, hold=True), Part('Line', 'left'), Part('Line', 'left')]
+    if biased:
+        parts.append(Part('Line', 'up'))
+    return Schematic(tuple(parts))
+
+
+def _clamper_schematic(diode_reversed, biased, vbias_reversed):
+    parts = [
+        _source(f'Vin={_slot("vin")} V'),
+        # Held at its steady-state charge, see NodalSolver.settle
+        Part('Capacitor2', 'right', element=Element('C', 'C', 'in', 'out', 'vc')),
+        Part('push'),
+    ]
+    bottom = 'b' if biased else '0'
+    parts.append(Part('Diode', 'down', flip=diode_reversed, element=_diode('out', bottom, diode_reversed)))
+    if biased:
+        parts.append(Part('Battery', label=f'{_slot("vbias")} V', loc='bottom', flip=vbias_reversed, element=_battery('b', '0', vbias_reversed)))
+    parts += [Part('pop'), Part('Line', 'right')]
+    parts += _output(biased)
+    parts.append(Part('Resistor', 'down', element=Element('R', 'R', 'out', '0', 1.0)))
+    if biased:
+        parts.append(Part('Line'))
+    parts += [Part('Line', 'right', dot=True, hold=True), Part('Line', 'left'), Part('Line', 'left')]
+    if biased:
+        parts.append(Part('Line', 'up'))
+    return Schematic(tuple(parts))
+
+
+def _zener_diode1_schematic(diode_reversed):
+    return Schematic((
+        _source(f'Vin={_slot("vin")} V'),
+        Part('Resistor', 'right', f'{_slot("r")} kΩ', 'top', element=Element('R', 'R', 'in', 'out', 1.0)),
+        Part('Zener', 'down', f'Vz={_slot("vz")}V', 'bot', diode_reversed, element=_diode('out', '0', diode_reversed, 'Z', 'Z', 'vz')),
+        Part('Line', 'left'),
+    ))
+
+
+def _zener_diode2_schematic(diode_reversed):
+    # The reversed drawing has always labelled Vz without the "Vz=" prefix
+    vz_label = f'{_slot("vz")}V' if diode_reversed else f'Vz={_slot("vz")}V'
+    return Schematic((
+        _source('Vs', 'vs'),
+        Part('Resistor', 'right', f'{_slot("r1")} kΩ', 'top', element=Element('R', 'R1', 'in', 'out', 1.0)),
+        Part('Zener', 'down', vz_label, 'bot', diode_reversed, hold=True, element=_diode('out', '0', diode_reversed, 'Z', 'Z', 'vz')),
+        Part('Line', 'right'),
+        Part('Resistor', 'down', f'{_slot("r2")} kΩ', 'bottom', element=Element('R', 'R2', 'out', '0', 1.0)),
+        Part('Line', 'left'),
+        Part('Line', 'left'),
+    ))
+
+
+def _zener_diode3_schematic(diode_reversed):
+    return Schematic((
+        _source(f'Vin={_slot("vin")} V'),
+        Part('Resistor', 'right', f'{_slot("r1")} kΩ', 'top', element=Element('R', 'R1', 'in', 'out', 1.0)),
+        Part(
+            'Zener', 'down', f'{_slot("vz")} V' if diode_reversed else None, 'bottom' if diode_reversed else None,
+            diode_reversed, hold=True, element=_diode('out', '0', diode_reversed, 'Z', 'Z', 'vz')
+        ),
+        Part('Line', 'right'),
+        Part('ResistorVar', 'down', 'Rv', 'bottom', True, element=Element('R', 'Rv', 'out', '0', 1.0)),
+        Part('Line', 'left'),
+        Part('Line', 'left'),
+    ))
+
+
+_SCHEMATICS = {
+    'clipper': _clipper_schematic,
+    'parallel_clipper': _parallel_clipper_schematic,
+    'clamper': _clamper_schematic,
+    'zener_diode1': _zener_diode1_schematic,
+    'zener_diode2': _zener_diode2_schematic,
+    'zener_diode3': _zener_diode3_schematic,
+}
+_LAYOUTS = {'series': 'clipper', 'parallel': 'parallel_clipper'}
+
+
+@functools.lru_cache(maxsize=None)
+def schematic(key):
+    """Schematic for a topology key: (layout, *flags) as in CircuitDrawer.topologies"""
+    layout, *flags = key
+    return _SCHEMATICS[layout](*flags)
+
+
+def topology_key(circuit_type, diode_reversed, biased=False, vbias_reversed=False):
+    """Topology key of a circuit: the layout it is drawn with and its orientation flags"""
+    if circuit_type.startswith('zener'):
+        return circuit_type, bool(diode_reversed)
+    layout = _LAYOUTS.get(circuit_type.split('_')[0], 'clamper')
+    return layout, bool(diode_reversed), bool(biased), bool(biased and vbias_reversed)
+
+
+def draw_schematic(schematic):
+    """
+    Lay a Schematic out with schemdraw and return the SVG. Labels must stay as
+    <text> (not glyph paths) for their @slot@ markers to be substituted, so the
+    SVG canvas and text mode are forced instead of whatever backend is installed.
+    """
+    schemdraw, elm = _schemdraw()
+    with schemdraw.Drawing(canvas='svg', show=False) as d:
+        for part in schematic.parts:
+            if part.shape == 'push':
+                d.push()
+                continue
+            if part.shape == 'pop':
+                d.pop()
+                continue
+
+            if part.shape in ('Diode', 'Zener'):
+                element = getattr(elm, part.shape)(reverse=part.flip)
+            else:
+                element = getattr(elm, part.shape)()
+                if part.flip:
+                    element.reverse()
+            if part.direction:
+                getattr(element, part.direction)()
+            if part.label is not None:
+                element.label(part.label, loc=part.loc)
+            if part.dot:
+                element.dot(open=True)
+            if part.hold:
+                element.hold()
+            d += element
+        return d.get_imagedata('svg')
+
+
+TRANSFER_CIRCUITS = (
+    'series_clipper', 'series_biasclipper', 'parallel_clipper',
+    'parallel_biasclipper', 'nobias_clamper', 'bias_clamper'
+)
+
+# Diode models the clipper and clamper answers can be worked out with; None is
+# the ideal diode the course starts from
+DIODE_MODELS = {
+    'ideal': None,
+    'constant': DiodeModel(0.7),
+    'pwl': DiodeModel(0.6, 0.01),  # 0.7 V at 10 mA
+    'shockley': DiodeModel.shockley(1e-11),  # Is = 10 fA
+}
+
+
+def circuit_netlist(circuit_type, diode_reversed, biased=False, vbias_reversed=False):
+    """
+    Netlist of a clipper/clamper topology, from the same schematic it is drawn
+    with. Vin, Vbias and the clamper's capacitor charge are the parameters
+    'vin', 'vbias' and 'vc'; the output is node 'out'.
+    """
+    if circuit_type not in TRANSFER_CIRCUITS:
+        raise ValueError(f"Not a clipper or clamper circuit: {circuit_type}")
+    return schematic(topology_key(circuit_type, diode_reversed, biased, vbias_reversed)).netlist()
+
+
+_solvers = {}  # Ideal diodes: one per topology, so never evicted
+_practical_solvers = LRUCache(SOLVER_CACHE_SIZE)  # One per diode model and R, LRU
+
+
+def circuit_solver(circuit_type, diode_reversed, biased=False, vbias_reversed=False, diode_model=None, r_value=None):
+    """
+    Shared NodalSolver per netlist topology hash, so its per-state factorizations
+    are reused across problems (and across circuits with the same netlist).
+    A practical diode_model and the problem's r_value (kΩ) are set on the netlist;
+    ideal answers don't depend on R, so it is left at 1 kΩ otherwise. Practical
+    solvers pile up per R, so they go in a separate bounded LRU that can't push
+    out the ideal ones the grading path uses.
+    """
+    netlist = circuit_netlist(circuit_type, diode_reversed, biased, vbias_reversed)
+    if diode_model is not None:
+        if r_value is None:
+            # The 1 kΩ placeholder would give wrong practical answers without a word
+            raise ValueError("A practical diode_model needs the problem's r_value")
+        netlist = netlist.with_values(D=diode_model, R=r_value)
+        return _practical_solvers.get_or_create(netlist.topology_hash(), lambda: NodalSolver(netlist))
+    key = netlist.topology_hash()
+    solver = _solvers.get(key)
+    if solver is None:
+        solver = _solvers.setdefault(key, NodalSolver(netlist))
+    return solver
+
+
+def _circuit_values(solver, circuit_type, vbias, vin_peak):
+    """Fixed parameter values of one problem, settling the clamper's capacitor at the input peaks"""
+    values = {} if vbias is None else {'vbias': vbias}
+    if 'vc' in solver.parameters:
+        if vin_peak is None:
+            raise ValueError(f"{circuit_type} needs vin_peak to settle its capacitor")
+        values['vc'] = solver.settle('vc', vin=np.array([vin_peak, -vin_peak]), **values)
+    return values
+
+
+class TransferFunction:
+    """
+    Piecewise-linear Vo(Vin) table for one clipper/clamper configuration.
+    Pieces alternate between open intervals and breakpoints: piece 2*i is the
+    interval just below breakpoints[i] and piece 2*i + 1 is breakpoints[i]
+    itself, so any boundary behaviour of the answer key is kept exactly and
+    evaluation is a single searchsorted over the breakpoints.
+    """
+    __slots__ = ('breakpoints', 'forward_bias', 'slopes', 'offsets')
+
+    def __init__(self, breakpoints, forward_bias, slopes, offsets):
+        self.breakpoints = np.asarray(breakpoints, dtype=float)
+        self.forward_bias = np.asarray(forward_bias, dtype=bool)
+        self.slopes = np.asarray(slopes, dtype=float)
+        self.offsets = np.asarray(offsets, dtype=float)
+
+    @classmethod
+    def compile(cls, piece, thresholds):
+        """
+        Build the table from piece(vin) -> (forward_bias, slope, offset).
+        `thresholds` must hold every Vin the piece function compares against,
+        so sampling once per interval and once per breakpoint is exact.
+        """
+        breakpoints = sorted(set(float(t) for t in thresholds))
+        if not breakpoints:
+            return cls([], *zip(piece(0.0)))
+
+        samples = [breakpoints[0] - 1.0]
+        for lo, hi in zip(breakpoints, breakpoints[1:]):
+            samples += [lo, lo + (hi - lo) / 2]
+        samples += [breakpoints[-1], breakpoints[-1] + 1.0]
+        pieces = [tuple(piece(x)) for x in samples]
+
+        # Drop breakpoints the curve passes straight through
+        kept, kept_pieces = [], [pieces[0]]
+        for i, bp in enumerate(breakpoints):
+            at, after = pieces[2 * i + 1], pieces[2 * i + 2]
+            if at == kept_pieces[-1] == after:
+                continue
+            kept.append(bp)
+            kept_pieces += [at, after]
+
+        return cls(kept, *zip(*kept_pieces))
+
+    def _locate(self, vin):
+        idx = np.searchsorted(self.breakpoints, vin, side='left')
+        if len(self.breakpoints) == 0:
+            return idx
+        on_breakpoint = (idx < len(self.breakpoints)) & (self.breakpoints[np.minimum(idx, len(self.breakpoints) - 1)] == vin)
+        return 2 * idx + on_breakpoint
+
+    def evaluate(self, vin):
+        """Return (forward_bias, vo) arrays for an array of vin in O(log k) per point"""
+        vin = np.asarray(vin, dtype=float)
+        pos = self._locate(vin)
+        slope = self.slopes[pos]
+        offset = self.offsets[pos]
+        # Flat pieces return the level itself so Vo is never -0.0
+        return self.forward_bias[pos], np.where(slope == 0, offset, slope * vin + offset)
+
+    def switch_points(self):
+        """Vin values where the diode changes state"""
+        fb = self.forward_bias
+        return self.breakpoints[(fb[0:-1:2] != fb[1::2]) | (fb[1::2] != fb[2::2])]
+
+    def inverse(self, vo):
+        """
+        Every Vin where the curve crosses `vo`, sorted. Flat (clipped) pieces are
+        excluded since they reach their level over a whole interval rather than
+        at a point; use switch_points() for their edges.
+        """
+        solutions = []
+        bounds = np.concatenate(([-np.inf], self.breakpoints, [np.inf]))
+        for i in range(len(self.breakpoints) + 1):
+            slope, offset = self.slopes[2 * i], self.offsets[2 * i]
+            if slope != 0:
+                vin = (vo - offset) / slope
+                if bounds[i] < vin < bounds[i + 1]:
+                    solutions.append(vin)
+        for i, bp in enumerate(self.breakpoints):
+            if self.slopes[2 * i + 1] != 0 and self.slopes[2 * i + 1] * bp + self.offsets[2 * i + 1] == vo:
+                solutions.append(bp)
+        return np.array(sorted(solutions))
+
+    def __len__(self):
+        return len(self.breakpoints)
+
+
+@functools.lru_cache(maxsize=1024)
+def transfer_function(circuit_type, diode_reversed, vbias=None, vbias_reversed=None, vin_peak=None, diode_model=None, r_value=None):
+    """
+    Compiled (and cached) TransferFunction for one circuit configuration, with an
+    ideal or piecewise-linear diode_model. A clamper without vin_peak, or a bias
+    clipper without vbias or vbias_reversed, gives (False, 0 V) everywhere.
+    """
+    if circuit_type not in TRANSFER_CIRCUITS:
+        raise ValueError(f"Not a clipper or clamper circuit: {circuit_type}")
+    if diode_model is not None and diode_model.saturation is not None:
+        raise ValueError("A Shockley diode has no piecewise-linear transfer function")
+    if (circuit_type.endswith('clamper') and vin_peak is None) or (
+        circuit_type in ('series_biasclipper', 'parallel_biasclipper') and (vbias is None or vbias_reversed is None)
+    ):
+        # Missing inputs; the answer key has always given (False, 0 V) for these
+        return TransferFunction([], [False], [0.0], [0.0])
+
+    solver = circuit_solver(circuit_type, diode_reversed, vbias is not None, bool(vbias_reversed), diode_model, r_value)
+    values = _circuit_values(solver, circuit_type, vbias, vin_peak)
+
+    def piece(vin):
+        if 'vc' in values:
+            # Past the input peaks the capacitor would charge further and a held charge
+            # has no solution, so the end pieces of the swing carry on outside it
+            vin = min(max(vin, -vin_peak), vin_peak)
+        (diode,), slope, offset = solver.piece('out', 'vin', vin=vin, **values)
+        return diode != OFF, float(slope), float(offset)
+
+    breakpoints = solver.breakpoints('vin', **values)
+    return TransferFunction.compile(piece, breakpoints)
+
+
+def calculate_correct_values(vin, diode_reversed, circuit_type='series_clipper', vbias=None, vbias_reversed=None, vin_peak=None, vz=None, iz_max=None, iz_min=None, r_value=None):
+    """
+    Calculate correct values based on diode orientation and Vin.
+    The Zener circuits also need the problem's r_value (kΩ, a tuple for zener_diode2).
+    """
+    if circuit_type in TRANSFER_CIRCUITS:
+        forward_bias, vo = transfer_function(circuit_type, *_transfer_config(diode_reversed, vbias, vbias_reversed, vin_peak)).evaluate(vin)
+        return bool(forward_bias), float(vo)
+
+    elif circuit_type == 'zener_diode1':
+        if vin_peak is None or vz is None:
+            return False, 0, 0, 0, 0
+        r_value = r_value*1000
+        Vr = vin_peak - vz
+        Ir = Vr / r_value
+        Pr = Ir * Vr
+        Pz = Ir * vz
+        return True, Vr, Ir, Pr, Pz
+
+    elif circuit_type == 'zener_diode2':
+        if vin_peak is None or vz is None:
+            return False, 0, 0, 0, 0, 0, 0, 0
+        r_values = r_value  # kΩ with iz in mA, so Il and Vr come out in mA and V
+        Il = vz / r_values[1]
+        if iz_min: #if iz_max exists (iz min is either 0 or a random number)
+            Ir_min = iz_min + Il
+        else:
+            Ir_max = iz_max + Il
+            Ir_min = Il
+            iz_min = 0
+        Vr_max = iz_max * r_values[0]  # Use r1_value
+        Vs_max = Vr_max + vz
+        Vr_min = iz_min * r_values[0]   # Use r1_value
+        Vs_min = Vr_min + vz
+        return True, Il, Vr_max, Vs_max, Vr_min, Vs_min, 0, 0
+
+    elif circuit_type == 'zener_diode3':
+        if vin_peak is None or vz is None:
+            return False, 0, 0, 0, 0, 0, 0, 0
+        r_value = r_value * 1000
+        Vr = vin_peak - vz
+        Ir = Vr / r_value
+        Il_max = Ir - iz_max 
+        if iz_min is not None:
+            Il_min = Ir - iz_min 
+        else:
+            Il_min = Ir
+            iz_min = 0
+        Rl_max = vz / Il_max if Il_max != 0 else float('inf')
+        Rl_min = vz / Il_min if Il_min != 0 else float('inf')
+        return True, Vr, Ir, Il_max, Il_min, Rl_max, Rl_min, 0, 0, 0
+
+    
+    return False, 0, 0, 0, 0
+
+        
+
+def calculate_correct_values_batch(vin, diode_reversed, circuit_type='series_clipper', vbias=None, vbias_reversed=None, vin_peak=None, diode_model=None, r_value=None):
+    """
+    Vectorized calculate_correct_values for the clipper and clamper circuits.
+    Every argument but diode_model and r_value may be a scalar or an array
+    broadcastable against vin. Returns (forward_bias, vo) arrays with the same
+    answers as the scalar version, or with a practical diode_model (one of
+    DIODE_MODELS) for a circuit with the problem's r_value (kΩ), which is then
+    required.
+    """
+    params = [diode_reversed, vbias, vbias_reversed, vin_peak]
+    if all(np.ndim(p) == 0 for p in params):
+        return _evaluator(circuit_type, _transfer_config(*params), diode_model, r_value)(vin)
+
+    # Mixed configurations: compile one table per distinct parameter set
+    varying = [i for i, p in enumerate(params) if p is not None]
+    vin, *columns = np.broadcast_arrays(
+        np.asarray(vin, dtype=float), *(np.asarray(params[i], dtype=float) for i in varying)
+    )
+    configs, inverse = np.unique(
+        np.stack([c.ravel() for c in columns], axis=1), axis=0, return_inverse=True
+    )
+    inverse = inverse.ravel()
+
+    flat_vin = vin.ravel()
+    fb = np.empty(flat_vin.shape, dtype=bool)
+    vo = np.empty(flat_vin.shape)
+    for group, row in enumerate(configs):
+        values = list(params)
+        for i, value in zip(varying, row):
+            values[i] = value
+        mask = inverse == group
+        fb[mask], vo[mask] = _evaluator(circuit_type, _transfer_config(*values), diode_model, r_value)(flat_vin[mask])
+    return fb.reshape(vin.shape), vo.reshape(vin.shape)
+
+
+def _evaluator(circuit_type, config, diode_model, r_value):
+    """vin -> (forward_bias, vo) for one configuration"""
+    if diode_model is None or diode_model.saturation is None:
+        return transfer_function(circuit_type, *config, diode_model, None if diode_model is None else r_value).evaluate
+
+    # Shockley: no pieces to compile, Newton-solve the points directly
+    diode_reversed, vbias, vbias_reversed, vin_peak = config
+    solver = circuit_solver(circuit_type, diode_reversed, vbias is not None, bool(vbias_reversed), diode_model, r_value)
+    values = _circuit_values(solver, circuit_type, vbias, vin_peak)
+
+    def evaluate(vin):
+        solution = solver.solve_shockley(vin=vin, **values)
+        # Reverse leakage is a few pV here, which would only print as -0.0
+        return solution.conducting('D'), np.round(solution.voltage('out'), 9) + 0.0
+    return evaluate
+
+
+def _transfer_config(diode_reversed, vbias, vbias_reversed, vin_peak):
+    """Normalize parameters to plain Python values so they make stable cache keys"""
+    return (
+        bool(diode_reversed),
+        None if vbias is None else float(vbias),
+        None if vbias_reversed is None else bool(vbias_reversed),
+        None if vin_peak is None else float(vin_peak)
+    )
+
+
+# Problem generation -------------
+
+CIRCUIT_TYPES = (
+    'series_clipper', 'series_biasclipper', 'parallel_clipper', 'parallel_biasclipper',
+    'nobias_clamper', 'bias_clamper', 'zener_diode1', 'zener_diode2', 'zener_diode3'
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Problem:
+    """
+    One generated exercise. r_value is in kΩ (an (r1, r2) pair for zener_diode2);
+    the bias fields are None for unbiased circuits and the Zener fields are None
+    for everything but the Zener circuits. seed is the 64-bit seed the problem
+    was generated from, if any.
+
+    Frozen and slotted, so it hashes and compares by value and can be used as a
+    cache key or kept in session state as one small object.
+    """
+    circuit_type: str
+    vin_peak: float
+    diode_reversed: bool
+    r_value: float | tuple[float, float]
+    vbias: float | None = None
+    vbias_reversed: bool | None = None
+    vz: float | None = None
+    iz_max: float | None = None
+    iz_min: float | None = None
+    seed: int | None = None
+
+    # circuit index, flags, vin_peak, r1, r2, vbias, vz, iz_max, iz_min (NaN for None), seed
+    _PACKED = struct.Struct('<BB7dQ')
+    _DIODE_REVERSED = 1
+    _VBIAS_REVERSED = 2
+    _HAS_VBIAS_REVERSED = 4
+    _HAS_SEED = 8
+
+    def to_bytes(self):
+        """Fixed-size binary encoding, see from_bytes"""
+        flags = 0
+        if self.diode_reversed:
+            flags |= self._DIODE_REVERSED
+        if self.vbias_reversed is not None:
+            flags |= self._HAS_VBIAS_REVERSED
+            if self.vbias_reversed:
+                flags |= self._VBIAS_REVERSED
+        if self.seed is not None:
+            flags |= self._HAS_SEED
+        r1, r2 = self.r_value if isinstance(self.r_value, tuple) else (self.r_value, None)
+        return self._PACKED.pack(
+            CIRCUIT_TYPES.index(self.circuit_type), flags,
+            *(np.nan if v is None else v for v in (self.vin_peak, r1, r2, self.vbias, self.vz, self.iz_max, self.iz_min)),
+            self.seed or 0
+        )
+
+    @classmethod
+    def from_bytes(cls, data):
+        index, flags, vin_peak, r1, r2, vbias, vz, iz_max, iz_min, seed = cls._PACKED.unpack(data)
+        vin_peak, r1, r2, vbias, vz, iz_max, iz_min = (
+            None if v != v else v for v in (vin_peak, r1, r2, vbias, vz, iz_max, iz_min)
+        )
+        return cls(
+            CIRCUIT_TYPES[index], vin_peak, bool(flags & cls._DIODE_REVERSED),
+            r1 if r2 is None else (r1, r2), vbias,
+            bool(flags & cls._VBIAS_REVERSED) if flags & cls._HAS_VBIAS_REVERSED else None,
+            vz, iz_max, iz_min, seed if flags & cls._HAS_SEED else None
+        )
+
+
+def new_seed():
+    """Fresh 64-bit problem seed"""
+    return random.getrandbits(64)
+
+
+def generate_problem(circuit_type, seed=None):
+    """
+    Draw the parameters for a new problem of `circuit_type` from a 64-bit seed
+    (a fresh one if none is given). The same circuit type and seed always rebuild
+    the same problem, and with it the same drawing and answer key.
+    """
+    if circuit_type not in CIRCUIT_TYPES:
+        raise ValueError(f"Unknown circuit type: {circuit_type}")
+    if seed is None:
+        seed = new_seed()
+    rng = random.Random(seed)
+
+    if circuit_type == 'zener_diode3':
+        vin_peak = round(rng.uniform(20.0, 75.0), 1)
+    else:
+        vin_peak = round(rng.uniform(5.0, 20.0), 1)
+
+    if circuit_type in ('series_clipper', 'parallel_clipper', 'nobias_clamper'):
+        diode_reversed = rng.choice([True, False])
+        r_value = rng.uniform(0.220, 10.0)
+        return Problem(circuit_type, vin_peak, diode_reversed, r_value, seed=seed)
+
+    elif circuit_type in ('series_biasclipper', 'parallel_biasclipper', 'bias_clamper'):
+        diode_reversed = rng.choice([True, False])
+        vbias = rng.uniform(2.0, 10.0)
+        vbias_reversed = rng.choice([True, False])
+        r_value = rng.uniform(0.220, 10.0)
+        return Problem(circuit_type, vin_peak, diode_reversed, r_value, vbias, vbias_reversed, seed=seed)
+
+    # Zener circuits are always drawn reverse biased
+    if rng.random() < 0.8:  # 80% of the time
+        vz = round(rng.uniform(vin_peak * 0.2, vin_peak * 0.8), 1)
+    else:
+        vz = round(rng.uniform(vin_peak * 0.8, vin_peak * 1.2), 1)
+
+    if circuit_type == 'zener_diode3':
+        iz_max = rng.uniform(2.0, 25.0)
+    else:
+        iz_max = rng.uniform(5.0, 30.0)
+    iz_min = rng.uniform(1.0, iz_max * 0.2) if rng.random() < 0.2 else None  # 20% of the time
+
+    if circuit_type == 'zener_diode2':
+        r_value = (rng.uniform(0.220, 10.0), rng.uniform(0.220, 10.0))
+    elif circuit_type == 'zener_diode3':
+        r_value = rng.uniform(0.220, 1.500)
+    else:
+        r_value = rng.uniform(0.220, 10.0)
+    return Problem(circuit_type, vin_peak, True, r_value, vz=vz, iz_max=iz_max, iz_min=iz_min, seed=seed)
+
+
+def table_vins(vin_peak):
+    """Vin rows students fill in for the clipper and clamper tables"""
+    return [vin_peak, vin_peak - 2.5, 0, -(vin_peak - 2.5), -vin_peak]
+
+
+def solve_problem(problem):
+    """
+    Answer key for a problem. Clippers and clampers give (vins, forward_bias, vo)
+    over the table rows; the Zener circuits give calculate_correct_values' tuple.
+    """
+    if problem.circuit_type in TRANSFER_CIRCUITS:
+        vins = table_vins(problem.vin_peak)
+        forward_bias, vo = calculate_correct_values_batch(
+            vins, problem.diode_reversed, problem.circuit_type,
+            problem.vbias, problem.vbias_reversed, problem.vin_peak
+        )
+        return vins, forward_bias, vo
+
+    return calculate_correct_values(
+        problem.vin_peak, problem.diode_reversed, problem.circuit_type,
+        vin_peak=problem.vin_peak, vz=problem.vz, iz_max=problem.iz_max,
+        iz_min=problem.iz_min, r_value=problem.r_value
+    )
+
+
+# Waveforms -------------
+
+def lttb(x, y, points):
+    """
+    Indices of `points` samples that keep the shape of the curve (x, y), by
+    largest-triangle-three-buckets: the first and last samples, then from each
+    of points - 2 equal buckets the sample spanning the largest triangle with
+    the previous pick and the mean of the next bucket.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    edges = (np.arange(points - 1) * ((n - 2) / (points - 2))).astype(int) + 1
+    edges[-1] = n - 1
+    # Mean of every bucket in one pass; the last bucket looks ahead to the final sample
+    counts = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts, y[-1])
+
+    picked = np.empty(points, dtype=int)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Twice the triangle area; the constant factor doesn't change the argmax
+        area = np.abs(
+            (x[a] - mean_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y[i + 1] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+@functools.lru_cache(maxsize=256)
+def waveform(problem, diode_model=None, samples=WAVEFORM_SAMPLES, points=WAVEFORM_POINTS):
+    """
+    Vin(t) and Vo(t) for a clipper or clamper over a sinusoidal input, as
+    (t, vin, vo) with t in periods. The whole period (three for a clamper) is
+    solved at `samples` points in one batch, then cut down to at most
+    2 * `points` samples with lttb on each curve, so what is sent to the browser
+    doesn't grow with the resolution.
+    """
+    if problem.circuit_type not in TRANSFER_CIRCUITS:
+        raise ValueError(f"Not a clipper or clamper circuit: {problem.circuit_type}")
+
+    periods = 3 if problem.circuit_type.endswith('clamper') else 1
+    t = np.linspace(0, periods, samples)
+    vin = problem.vin_peak * np.sin(2 * np.pi * t)
+    _, vo = calculate_correct_values_batch(
+        vin, problem.diode_reversed, problem.circuit_type, problem.vbias, problem.vbias_reversed,
+        problem.vin_peak, diode_model=diode_model, r_value=problem.r_value
+    )
+    keep = np.union1d(lttb(t, vin, points), lttb(t, vo, points))
+    curves = t[keep], vin[keep], vo[keep]
+    for curve in curves:
+        curve.flags.writeable = False  # Cached and shared between sessions
+    return curves
+
+
+def _clamped_recurrence(a, b, g, y0, lower):
+    """
+    y[n] = max(a * y[n-1] + b[n], g[n]) (min if not lower), from y[-1] = y0.
+    Unrolled with w[n] = a^-(n+1) and S the running sum of w * b, that is
+    y[n] = (S[n] + max(y0, max over k <= n of w[k] * g[k] - S[k])) / w[n], a
+    cumulative sum and a running maximum. Blocks keep w from overflowing.
+    """
+    pick, running = (np.maximum, np.maximum.accumulate) if lower else (np.minimum, np.minimum.accumulate)
+    if a < 1e-12:
+        return pick(b, g)  # Nothing carries over between samples
+    if a >= 1 - np.finfo(float).eps:
+        # RC too long to discharge at all, and -log(a) would be 0 below
+        s = np.cumsum(b)
+        return s + pick(y0, running(g - s))
+    block = max(1, int(230 / -np.log(a)))  # w stays below ~1e100
+    y = np.empty(len(b))
+    for start in range(0, len(b), block):
+        w = a ** -np.arange(1, len(b[start:start + block]) + 1)
+        s = np.cumsum(w * b[start:start + block])
+        y[start:start + len(w)] = (s + pick(y0, running(w * g[start:start + block] - s))) / w
+        y0 = y[start + len(w) - 1]
+    return y
+
+
+def simulate_clamper(problem, capacitance, frequency, cycles=CLAMPER_CYCLES, samples=WAVEFORM_SAMPLES, diode_model=None):
+    """
+    Transient response of a clamper from an uncharged capacitor, as (t, vin, vo)
+    with t in periods, for C in µF, the input frequency in Hz and the problem's
+    R (kΩ). While the diode blocks, C discharges through R, solved exactly
+    between samples with Vin linear in between; while it conducts, the output
+    sits at its clamp level and C follows the input. So the charge-up and the
+    droop per cycle come from RC / period, unlike the steady state answer.
+    """
+    if not problem.circuit_type.endswith('clamper'):
+        raise ValueError(f"Not a clamper circuit: {problem.circuit_type}")
+    if capacitance <= 0 or frequency <= 0:
+        raise ValueError("Capacitance and frequency must be positive")
+
+    t = np.linspace(0, cycles, samples)
+    vin = problem.vin_peak * np.sin(2 * np.pi * t)
+    solver = circuit_solver(
+        problem.circuit_type, problem.diode_reversed, problem.vbias is not None, bool(problem.vbias_reversed),
+        diode_model, problem.r_value
+    )
+    values = {} if problem.vbias is None else {'vbias': problem.vbias}
+    # The diode blocks while the capacitor charge stays on one side of this bound
+    bound, lower = solver.blocking_bound('vc', vin=vin, **values)
+
+    tau = problem.r_value * capacitance * 1e-3 * frequency  # kΩ * µF = ms, in periods
+    dt = t[1] - t[0]
+    a = np.exp(-dt / tau)
+    b = vin[1:] - a * vin[:-1] - np.diff(vin) / dt * tau * (1 - a)
+    vc0 = max(0.0, bound[0]) if lower else min(0.0, bound[0])
+    vc = np.concatenate(([vc0], _clamped_recurrence(a, b, bound[1:], vc0, lower)))
+    return t, vin, vin - vc
+
+
+@functools.lru_cache(maxsize=256)
+def clamper_waveform(problem, capacitance, frequency, diode_model=None, points=WAVEFORM_POINTS):
+    """simulate_clamper cut down with lttb like waveform, cached per problem and RC"""
+    t, vin, vo = simulate_clamper(problem, capacitance, frequency, diode_model=diode_model)
+    keep = np.union1d(lttb(t, vin, points), lttb(t, vo, points))
+    curves = t[keep], vin[keep], vo[keep]
+    for curve in curves:
+        curve.flags.writeable = False
+    return curves
+
+
+class ProblemPrefetcher:
+    """
+    Keeps `depth` ready (problem, svg) pairs per circuit type, generated and
+    drawn on a background thread. A first-seen topology costs a full schemdraw
+    layout, so drawing ahead keeps that off the path of a button click.
+    """
+    def __init__(self, drawer, depth=2, circuit_types=CIRCUIT_TYPES):
+        self.drawer = drawer
+        self.depth = depth
+        self._ready = {circuit_type: deque() for circuit_type in circuit_types}
+        self._lock = threading.Lock()
+        self._wanted = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='problem-prefetch', daemon=True)
+        self._wanted.set()
+        self._thread.start()
+
+    def take(self, circuit_type):
+        """Pop a ready (problem, svg) pair, or make one inline if the queue has run dry"""
+        with self._lock:
+            ready = self._ready[circuit_type]
+            item = ready.popleft() if ready else None
+        self._wanted.set()
+
+        if item is None:
+            item = self._make(circuit_type)
+        return item
+
+    def pending(self, circuit_type):
+        with self._lock:
+            return len(self._ready[circuit_type])
+
+    def close(self):
+        self._closed = True
+        self._wanted.set()
+        self._thread.join()
+
+    def _make(self, circuit_type):
+        problem = generate_problem(circuit_type)
+        return problem, self.drawer.draw_problem(problem)
+
+    def _run(self):
+        while True:
+            self._wanted.wait()
+            self._wanted.clear()
+            if self._closed:
+                return
+
+            for circuit_type, ready in self._ready.items():
+                while len(ready) < self.depth and not self._closed:
+                    try:
+                        item = self._make(circuit_type)
+                    except RenderBusy:
+                        # Interactive renders come first; refill on the next take()
+                        break
+                    except Exception:
+                        # E.g. a broken render pool; keep the thread and retry on the next take()
+                        traceback.print_exc()
+                        break
+                    with self._lock:
+                        ready.append(item)
@@ -0,0 +1,201 @@
+"""
+Multi-session load test.
+
+    python loadtest.py --sessions 40 --workers 4 --rounds 5 --json load.json
+
+Simulates a class working through problems at once. Every simulated student is
+its own AppTest session; each round it clicks a random nav button, fills in
+the answer form and submits "Check". Reports the end-to-end latency of each
+step, overall throughput and the memory each session adds, for sizing
+deployments.
+
+AppTest swaps a process-wide Runtime in and out around every run, so sessions
+can't run on threads. Instead each worker process keeps its share of the
+sessions open and interleaves them round by round (so they share cached
+resources like a real server process does), and the worker processes run in
+parallel to load the machine.
+"""
+import argparse
+import json
+import multiprocessing
+import pickle
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from bench import APP_PATH, NAV_LABELS
+
+STEPS = ('load', 'new_problem', 'check')
+
+
+def _max_rss_bytes():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class Session:
+    """One simulated student"""
+    def __init__(self, seed, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.rng = random.Random(seed)
+        self.timeout = timeout
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.failed = False
+
+    def _run(self, step, latencies, errors):
+        start = time.perf_counter()
+        self.at.run(timeout=self.timeout)
+        latencies[step].append(time.perf_counter() - start)
+        if self.at.exception:
+            errors.append(f"{step}: {self.at.exception[0].message}")
+            self.failed = True
+        return not self.failed
+
+    def load(self, latencies, errors):
+        self._run('load', latencies, errors)
+
+    def solve_one(self, latencies, errors):
+        """Click a random nav button, answer every input at random and submit"""
+        label = self.rng.choice(list(NAV_LABELS.values()))
+        buttons = [b for b in self.at.button if b.label == label]
+        if not buttons:
+            errors.append(f"new_problem: no '{label}' button")
+            self.failed = True
+            return
+        buttons[0].click()
+        if not self._run('new_problem', latencies, errors):
+            return
+
+        for number_input in self.at.number_input:
+            number_input.set_value(round(self.rng.uniform(-10, 10), 1))
+        for checkbox in self.at.checkbox:
+            checkbox.set_value(self.rng.random() < 0.5)
+        for text_input in self.at.text_input:
+            text_input.set_value(f"{self.rng.uniform(0, 999):.1f}{self.rng.choice(['', 'm', 'μ', 'k'])}")
+        if 'answer_grid' in self.at.session_state:
+            # The answer grid is a data editor; AppTest fills it through its edit state
+            with_fb = 'clamper' not in self.at.session_state['circuit_type']
+            edits = {}
+            for row in range(5):
+                edits[row] = {'vo': round(self.rng.uniform(-10, 10), 1)}
+                if with_fb:
+                    edits[row]['fb'] = self.rng.random() < 0.5
+            self.at.session_state['answer_grid'] = {'edited_rows': edits, 'added_rows': [], 'deleted_rows': []}
+        submit = [b for b in self.at.button if b.label == 'Check']
+        if submit:
+            submit[0].click()
+            self._run('check', latencies, errors)
+
+    def state_bytes(self):
+        return len(pickle.dumps(self.at.session_state.to_dict()))
+
+
+def run_worker(seeds, rounds, think_time, timeout):
+    """Worker-process job: open one session per seed and play them all, interleaved"""
+    latencies = {step: [] for step in STEPS}
+    errors = []
+    rss_before = _max_rss_bytes()
+
+    sessions = [Session(seed, timeout) for seed in seeds]
+    for session in sessions:
+        session.load(latencies, errors)
+    for _ in range(rounds):
+        for session in sessions:
+            if not session.failed:
+                session.solve_one(latencies, errors)
+            if think_time:
+                time.sleep(think_time * session.rng.random())
+
+    return {
+        'latencies': latencies,
+        'errors': errors,
+        'sessions': len(sessions),
+        'rss_growth_bytes': _max_rss_bytes() - rss_before,
+        'state_bytes': [session.state_bytes() for session in sessions],
+    }
+
+
+def _distribution(samples):
+    if not samples:
+        return None
+    ms = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'n': len(ms),
+        'mean_ms': round(float(ms.mean()), 2),
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'max_ms': round(float(ms.max()), 2),
+    }
+
+
+def run_load(sessions, workers, rounds, think_time, timeout, seed):
+    seeds = [seed + i for i in range(sessions)]
+    shares = [seeds[w::workers] for w in range(workers) if seeds[w::workers]]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(len(shares), mp_context=multiprocessing.get_context('spawn')) as pool:
+        reports = list(pool.map(
+            run_worker, shares, [rounds] * len(shares), [think_time] * len(shares), [timeout] * len(shares)
+        ))
+    elapsed = time.perf_counter() - start
+
+    steps = {step: [t for r in reports for t in r['latencies'][step]] for step in STEPS}
+    interactions = sum(len(samples) for samples in steps.values())
+    errors = [e for r in reports for e in r['errors']]
+    return {
+        'sessions': sessions,
+        'workers': len(shares),
+        'rounds': rounds,
+        'elapsed_s': round(elapsed, 2),
+        'throughput_per_s': round(interactions / elapsed, 2),
+        'latency': {step: _distribution(samples) for step, samples in steps.items()},
+        'all_latency': _distribution([t for samples in steps.values() for t in samples]),
+        'memory': {
+            # Peak RSS growth of each worker over the run, spread over its sessions
+            'rss_per_session_bytes': int(np.mean([r['rss_growth_bytes'] / r['sessions'] for r in reports])),
+            'session_state_bytes_mean': int(np.mean([b for r in reports for b in r['state_bytes']])),
+        },
+        'errors': len(errors),
+        'error_samples': errors[:10],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many concurrent Electra sessions")
+    parser.add_argument('-s', '--sessions', type=int, default=20, help="simulated students")
+    parser.add_argument('-j', '--workers', type=int, default=4, help="worker processes the sessions are spread over")
+    parser.add_argument('-r', '--rounds', type=int, default=5, help="problems each student works through")
+    parser.add_argument('--think-time', type=float, default=0.0, help="max random pause between students, in seconds")
+    parser.add_argument('--timeout', type=float, default=120.0, help="per-rerun timeout, in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="write the report to this file")
+    args = parser.parse_args()
+
+    report = run_load(args.sessions, args.workers, args.rounds, args.think_time, args.timeout, args.seed)
+
+    print(f"{report['sessions']} sessions x {report['rounds']} rounds on {report['workers']} workers: "
+          f"{report['elapsed_s']}s, {report['throughput_per_s']} reruns/s, {report['errors']} errors")
+    for step, dist in list(report['latency'].items()) + [('all', report['all_latency'])]:
+        if dist:
+            print(f"  {step:12s} n={dist['n']:<5d} p50 {dist['p50_ms']:8.1f}ms  p95 {dist['p95_ms']:8.1f}ms  "
+                  f"p99 {dist['p99_ms']:8.1f}ms  max {dist['max_ms']:8.1f}ms")
+    memory = report['memory']
+    print(f"  memory: ~{memory['rss_per_session_bytes'] / 1024:.0f} KiB RSS per session, "
+          f"{memory['session_state_bytes_mean']} bytes of session state")
+    for error in report['error_samples']:
+        print(f"  error: {error}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,26 @@
 import streamlit as st
 import base64
-import schemdraw
-import schemdraw.elements as elm
-import random
-
+import functools
+import os
+import re
+import threading
+from decimal import Decimal
+import numpy as np
+from bank import ProblemBank
+from engine import (
+    CIRCUIT_TYPES, DIODE_MODELS, TRANSFER_CIRCUITS, CircuitDrawer, ProblemPrefetcher, RenderBusy,
+    RenderService, SvgStore, calculate_correct_values, calculate_correct_values_batch, generate_problem, table_vins,
+    clamper_waveform, waveform
+)
+
+ENGINEERING_PREFIXES = ('n', 'μ', 'm', '', 'k', 'M', 'G')  # Exponents -9 to 9 in steps of 3
+PREFIX_EXPONENTS = {'n': -9, 'u': -6, 'μ': -6, 'µ': -6, 'm': -3, '': 0, 'k': 3, 'K': 3, 'M': 6, 'G': 9}
+ENGINEERING_INPUT = re.compile(
+    r'^\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([' + ''.join(PREFIX_EXPONENTS) + r']?)\s*(\S*)\s*$'
+)
+
+
+@functools.lru_cache(maxsize=4096)
 def to_engineering_notation(value, unit=''):
     """
     Convert value to engineering notation string with specified units
@@ -11,20 +28,10 @@ def to_engineering_notation(value, unit=''):
     """
     if value == 0:
         return f"0 {unit}"
-    
-    prefixes = {
-        -9: 'n',
-        -6: 'μ',
-        -3: 'm',
-        0: '',
-        3: 'k',
-        6: 'M',
-        9: 'G'
-    }
-    
+
     exponent = 0
     abs_val = abs(value)
-    
+
     # Find appropriate exponent
     if abs_val >= 1000:
         while abs_val >= 1000 and exponent < 9:
@@ -34,502 +41,202 @@ def to_engineering_notation(value, unit=''):
         while abs_val < 1 and exponent > -9:
             abs_val *= 1000
             exponent -= 3
-    
-    prefix = prefixes.get(exponent, '')
-    
+
     # Format with 2 decimal places if needed, but remove trailing .00
     formatted = f"{abs_val:.2f}".rstrip('0').rstrip('.')
-    
-    # Handle trailing .00 for values that are exactly integers
-    if '.' in formatted and formatted.endswith('.'):
-        formatted = formatted[:-1]
-    
+
     # Handle negative values
     if value < 0:
         formatted = f"-{formatted}"
-    
-    return f"{formatted}{prefix}{unit}"
-
-
-
-class CircuitDrawer:
-    def __init__(self):
-        self.circuit_functions = {
-            'series_clipper': self.series_clipper,
-            'series_biasclipper': self.series_biasclipper,
-            'parallel_clipper': self.parallel_clipper,
-            'parallel_biasclipper': self.parallel_biasclipper,
-            'nobias_clamper': self.nobias_clamper,
-            'bias_clamper': self.bias_clamper,
-            'zener_diode1': self.zener_diode1,
-            'zener_diode2': self.zener_diode2,
-            'zener_diode3': self.zener_diode3
-        }
 
-    def draw_circuit(self, circuit_type, *args):
-        if circuit_type in self.circuit_functions:
-            return self.circuit_functions[circuit_type](*args)
-        else:
-            raise ValueError(f"Unknown circuit type: {circuit_type}")
+    return f"{formatted}{ENGINEERING_PREFIXES[exponent // 3 + 3]}{unit}"
 
-    def series_clipper(self, vin_peak, diode_reversed):
-        return self._draw_clipper(vin_peak, diode_reversed, None, None)
 
-    def series_biasclipper(self, vin_peak, diode_reversed, vbias, vbias_reversed):
-        return self._draw_clipper(vin_peak, diode_reversed, vbias, vbias_reversed)
+def to_engineering_notation_array(values, unit=''):
+    """
+    to_engineering_notation over a whole array at once, as a list of strings.
+    `unit` may also be a sequence, one unit per value.
+    """
+    values = np.asarray(values, dtype=float)
+    abs_vals = np.abs(values)
+    scaled = abs_vals.copy()
+    exponent = np.zeros(values.shape, dtype=int)
+    # Same step-by-1000 operations as the scalar version, masked per element
+    for _ in range(3):
+        step = (scaled >= 1000) & (exponent < 9)
+        scaled = np.where(step, scaled / 1000, scaled)
+        exponent += 3 * step
+    for _ in range(3):
+        step = (abs_vals < 1) & (abs_vals != 0) & (scaled < 1) & (exponent > -9)
+        scaled = np.where(step, scaled * 1000, scaled)
+        exponent -= 3 * step
+
+    digits = np.char.rstrip(np.char.rstrip(np.char.mod('%.2f', scaled), '0'), '.')
+    signs = np.where(values < 0, '-', '')
+    prefixes = np.array(ENGINEERING_PREFIXES)[exponent // 3 + 3]
+    out = np.char.add(np.char.add(np.char.add(signs, digits), prefixes), unit)
+    return np.where(values == 0, np.char.add("0 ", unit), out).tolist()
+
+
+def parse_engineering_notation(text, unit=''):
+    """
+    Inverse of to_engineering_notation: '4.7k' -> 4700.0, '12m' -> 0.012,
+    '500.00mV' -> 0.5. The unit is optional but has to match if given.
+    Raises ValueError for anything else.
+    """
+    match = ENGINEERING_INPUT.match(text)
+    if match is None or match.group(3) not in ('', unit):
+        raise ValueError(f"Can't read {text!r} as a value in {unit or 'engineering notation'}")
+    number, prefix, _ = match.groups()
+    # Decimal keeps e.g. 4.7k at exactly the double nearest 4700
+    return float(Decimal(number).scaleb(PREFIX_EXPONENTS[prefix]))
 
-    def parallel_clipper(self, vin_peak, diode_reversed):
-        return self._draw_parallel_clipper(vin_peak, diode_reversed, None, None)
 
-    def parallel_biasclipper(self, vin_peak, diode_reversed, vbias, vbias_reversed):
-        return self._draw_parallel_clipper(vin_peak, diode_reversed, vbias, vbias_reversed)
+def engineering_input(label, unit, slot):
+    """Text input that takes values like 4.7k or 12m; None if it can't be read"""
+    text = st.text_input(f"{label} [{unit}]", value="0", placeholder="e.g. 4.7k or 12m", key=answer_key(slot))
+    try:
+        return parse_engineering_notation(text, unit)
+    except ValueError:
+        return None
 
-    def nobias_clamper(self, vin_peak, diode_reversed):
-        return self._draw_clamper(vin_peak, diode_reversed, None, None)
 
-    def bias_clamper(self, vin_peak, diode_reversed, vbias, vbias_reversed):
-        return self._draw_clamper(vin_peak, diode_reversed, vbias, vbias_reversed)
+def unreadable(*values):
+    """Show an error and return True if any engineering_input couldn't be read"""
+    if any(value is None for value in values):
+        st.error("Enter answers as numbers with an optional prefix, like 4.7k, 12m or 330μ.")
+        return True
+    return False
 
-    def zener_diode1(self, vin_peak, diode_reversed):
-        with schemdraw.Drawing(show=False) as d:
-            d += elm.SourceV().up().label(f'Vin={vin_peak:.1f} V')
-            r_value = random.uniform(0.220, 10.0)
-            d += elm.Resistor().right().label(f'{r_value:.3f} kΩ', loc='top')
-            
-            vz = st.session_state.vz  # Get from session state
-            if diode_reversed:
-                d += elm.Zener(reverse=True).down().label(f'Vz={vz:.1f}V', loc='bot')
-            else:
-                d += elm.Zener().down().label(f'Vz={vz:.1f}V', loc='bot')
-                
-            d += elm.Line().left()
-            return d.get_imagedata('svg'), r_value, diode_reversed
-    
-    def zener_diode2(self, vin_peak, diode_reversed):
-        with schemdraw.Drawing(show=False) as d:
-            d += elm.SourceV().up().label('Vs')
-            r1_value = random.uniform(0.220, 10.0)
-            d += elm.Resistor().right().label(f'{r1_value:.3f} kΩ', loc='top')
-            
-            vz = st.session_state.vz  # Get from session state
-            if diode_reversed:
-                d += elm.Zener(reverse=True).down().label(f'{vz:.1f}V', loc='bot').hold()
-            else:
-                d += elm.Zener().down().label(f'Vz={vz:.1f}V', loc='bot').hold()
-            
-            d += elm.Line().right()
-            r2_value = random.uniform(0.220, 10.0)
-            d += elm.Resistor().down().label(f'{r2_value:.3f} kΩ', loc='bottom')
-            d += elm.Line().left()
-            d += elm.Line().left()
-            
-            return d.get_imagedata('svg'), (r1_value, r2_value), diode_reversed
-    
-    def zener_diode3(self, vin_peak, diode_reversed):
-        with schemdraw.Drawing(show=False) as d:
-            d += elm.SourceV().up().label(f'Vin={vin_peak:.1f} V')
-            r1_value = random.uniform(0.220, 1.500)
-            d += elm.Resistor().right().label(f'{r1_value:.3f} kΩ', loc='top')
-            
-            vz = st.session_state.vz
-            if diode_reversed:
-                d += elm.Zener(reverse=True).down().hold().label(f'{vz:.1f} V', loc='bottom')
-            else:
-                d += elm.Zener().down().hold()
-            
-            d += elm.Line().right()
-            d += elm.ResistorVar().down().label('Rv', loc='bottom').reverse()
-            d += elm.Line().left()
-            d += elm.Line().left()
-            
-            return d.get_imagedata('svg'), r1_value, diode_reversed
-    
 
 
-    def _draw_clipper(self, vin_peak, diode_reversed, vbias, vbias_reversed):
-        with schemdraw.Drawing(show=False) as d:
-            d += elm.SourceV().up().label(f'Vin={vin_peak:.1f} V')
-            
-            if vbias is not None:
-                if vbias_reversed:
-                    d += elm.Battery().right().label(f'{vbias:.1f} V', loc='bottom').reverse()
-                else:
-                    d += elm.Battery().right().label(f'{vbias:.1f} V', loc='bottom')
-            
-            if diode_reversed:
-                d += elm.Diode(reverse=True).right()
-            else:
-                d += elm.Diode().right()
-            d.push()
-            d += elm.Line().dot(open=True)
-            d += elm.Gap().label(('+', '$V_o$', '-')).down()
-            d.pop()
-            r_value = random.uniform(0.220, 10.0)
-            d += elm.Resistor().down()
-            d += elm.Line().dot(open=True).right().hold()
-            d += elm.Line().left()
-            
-            if vbias is not None:
-                d += elm.Line()
-            
-            if vbias is not None:
-                return d.get_imagedata('svg'), r_value, diode_reversed, vbias, vbias_reversed
-            return d.get_imagedata('svg'), r_value, diode_reversed
-
-    def _draw_parallel_clipper(self, vin_peak, diode_reversed, vbias, vbias_reversed):
-        with schemdraw.Drawing(show=False) as d:
-            d += elm.SourceV().up().label(f'Vin={vin_peak:.1f} V')
-            d += elm.Line().right()
-            r_value = random.uniform(0.220, 10.0)
-            d += elm.Resistor().label(f'R={r_value:.3f} kΩ')
-            d.push()
-            d += elm.Line().dot(open=True)
-            if vbias is not None:
-                d += elm.Gap().label(('+', '', '$V_o$')).down()
-                d += elm.Gap().label(('-')).down()
-            else:
-                d += elm.Gap().label(('+', '$V_o$', '-')).down()
-            d.pop()
-            if diode_reversed:
-                d += elm.Diode(reverse=True).down()
-            else:
-                d += elm.Diode().down()
-            if vbias is not None:
-                if vbias_reversed:
-                    d += elm.Battery().label(f'{vbias:.1f} V', loc='bottom').reverse()
-                else:
-                    d += elm.Battery().label(f'{vbias:.1f} V', loc='bottom')
-            d += elm.Line().dot(open=True).right().hold()
-            d += elm.Line().left()
-            d += elm.Line().left()
-            if vbias is not None:
-                d += elm.Line().up()
-            
-            if vbias is not None:
-                return d.get_imagedata('svg'), r_value, diode_reversed, vbias, vbias_reversed
-            return d.get_imagedata('svg'), r_value, diode_reversed
-
-    def _draw_clamper(self, vin_peak, diode_reversed, vbias, vbias_reversed):
-        with schemdraw.Drawing(show=False) as d:
-            d += elm.SourceV().up().label(f'Vin={vin_peak:.1f} V')
-            d += elm.Capacitor2().right()
-            
-            d.push()
-            if diode_reversed:
-                d += elm.Diode(reverse=True).down()
-            else:
-                d += elm.Diode().down()
-            if vbias is not None:
-                if vbias_reversed:
-                    d += elm.Battery().label(f'{vbias:.1f} V', loc='bottom').reverse()
-                else:
-                    d += elm.Battery().label(f'{vbias:.1f} V', loc='bottom')
-                
-            d.pop()
-            d += elm.Line().right()
-            
-            d.push()
-            d += elm.Line().dot(open=True)
-            if vbias is not None:
-                d += elm.Gap().label(('+', '', '$V_o$')).down()
-                d += elm.Gap().label(('-')).down()
-            else:
-                d += elm.Gap().label(('+', '$V_o$', '-')).down()
-            d.pop()
-            
-            r_value = random.uniform(0.220, 10.0)
-            d += elm.Resistor().down()
-            if vbias is not None:
-                d += elm.Line()
-            d += elm.Line().dot(open=True).right().hold()
-            
-            d += elm.Line().left()
-            d += elm.Line().left()
-            if vbias is not None:
-                d += elm.Line().up()
-            if vbias is not None:
-                return d.get_imagedata('svg'), r_value, diode_reversed, vbias, vbias_reversed
-            return d.get_imagedata('svg'), r_value, diode_reversed
-        
+@st.cache_resource
+def get_render_service():
+    """Worker processes that run schemdraw layouts for every session"""
+    return RenderService()
 
-def calculate_correct_values(vin, diode_reversed, circuit_type='series_clipper', vbias=None, vbias_reversed=None, vin_peak=None, vz=None, iz_max=None, iz_min=None):
-    """Calculate correct values based on diode orientation and Vin"""
-    if circuit_type == 'series_clipper':
-        if not diode_reversed:
-            return (True, vin) if vin > 0 else (False, 0)
-        else:
-            return (False, 0) if vin > 0 else (True, vin) 
-            
-    elif circuit_type == 'series_biasclipper':
-        if vbias is None or vbias_reversed is None:
-            return False, 0
-        
-        # Forward Diode cases
-        if not diode_reversed:
-            if not vbias_reversed:  # Bias is FORWARD
-                if vin > vbias:
-                    return True, vin - vbias  
-                else:
-                    return False, 0           
-            else:                   # Bias is REVERSE
-                if vin > 0:
-                    return True, vin          
-                elif vin < -vbias:
-                    return False, 0           
-                else:
-                    return True, vin + vbias  
-        # Reversed Diode cases ----------
-        else:
-            if not vbias_reversed:  # Bias is FORWARD
-                if vin > 0 and vbias > vin:
-                    return True, -vbias + vin  
-                elif vin < 0:
-                    return True, -vbias + vin  
-                elif vin == 0:
-                    return True, -vbias    
-                else:
-                    return False, 0      
-            else:                   # Bias is REVERSE
-                if vin > 0:
-                    return False, 0
-                elif abs(vin) > vbias:
-                    return True, vin + vbias  
-                else:
-                    return False, 0           
-                
-    elif circuit_type == 'parallel_clipper':
-        if not diode_reversed: 
-            if vin > 0:
-                return True, 0
-            else:
-                return False, vin
-        else:  # Diode is reversed
-            if vin > 0:
-                return False, vin
-            else:
-                return True, 0
-    
-    elif circuit_type == 'parallel_biasclipper':
-        if vbias is None or vbias_reversed is None:
-            return False, 0
-        
-        # Forward Diode cases ---------
-        if not diode_reversed:
-            if not vbias_reversed:  # Bias is FORWARD
-                if vin > 0 and vin > vbias:
-                    return True, vbias
-                elif vin <= 0:
-                    return False, vin
-                else:
-                    return False, 0           
-            else:                   # Bias is REVERSE
-                if vin >= 0:
-                    return True, -vbias          
-                elif vin < 0 and abs(vbias) > abs(vin):
-                    return True, -vbias
-                elif vin < 0 and not(abs(vbias) > abs(vin)):
-                    return False, vin           
-                else:
-                    return False, 0 
-        # Reversed Diode cases ----------
-        else:
-            if not vbias_reversed:   # Bias is FORWARD
-                if vin <= 0:
-                    return True, vbias
-                elif vin > 0 and vbias > vin:
-                    return True, vbias
-                elif vin > 0 and vin > vbias:
-                    return False, vin
-                else: 
-                    return False, 0      
-            else:                     # Bias is REVERSE
-                if vin >= 0:
-                    return False, vin
-                elif abs(vin) > vbias:
-                    return True, -vbias
-                elif vin < 0 and abs(vin) < vbias:
-                    return False, -vin
-                else:
-                    return False, 0          
-    
-    elif circuit_type == 'nobias_clamper':
-        if vin_peak is None:
-            return False, 0
-        
-        # Forward Diode cases --------- 
-        if not diode_reversed:
-            if vin >= 0:
-                return False, vin - vin_peak   
-            elif vin < 0:
-                return False, vin - vin_peak
-            else:
-                return False, 0
-        # Reverse Diode cases --------- 
-        else:
-            if vin <= 0:
-                return False, vin + vin_peak
-            elif vin > 0:
-                return False, vin + vin_peak
-            else:
-                return False, 0
-    
-    elif circuit_type == 'bias_clamper':
-        if vin_peak is None:
-            return False, 0
-        
-        # Forward Diode cases --------- 
-        if not diode_reversed:
-            if not vbias_reversed:   # Bias is FORWARD
-                if vin >= 0:
-                    return False, vin - (vin_peak - vbias)   
-                elif vin < 0:
-                    return False, vin - (vin_peak - vbias)
-                else:
-                    return False, 0
-            else:                    # Bias is REVERSE
-                if vin <= 0:
-                    return False, vin - (vin_peak + vbias)   
-                elif vin > 0:
-                    return False, vin - (vin_peak + vbias)
-                else:
-                    return False, 0
-        # Reverse Diode cases --------- 
-        else:
-            if not vbias_reversed:   # Bias is FORWARD
-                if vin <= 0:
-                    return False, vin + (vin_peak + vbias)   
-                elif vin > 0:
-                    return False, vin + (vin_peak + vbias)
-                else:
-                    return False, 0
-            else:                    # Bias is REVERSE
-                if vin <= 0:
-                    return False, vin + (vin_peak - vbias)   
-                elif vin > 0:
-                    return False, vin + (vin_peak - vbias)
-                else:
-                    return False, 0
-    
-    elif circuit_type == 'zener_diode1':
-        if vin_peak is None or vz is None:
-            return False, 0, 0, 0, 0
-        r_value = st.session_state.r_value*1000
-        Vr = vin_peak - vz
-        Ir = Vr / r_value
-        Pr = Ir * Vr
-        Pz = Ir * vz
-        return True, Vr, Ir, Pr, Pz
-
-    elif circuit_type == 'zener_diode2':
-        if vin_peak is None or vz is None:
-            return False, 0, 0, 0, 0, 0, 0, 0
-        r_values = st.session_state.r_value*1000
-        Il = vz / r_values[1]
-        if iz_min: #if iz_max exists (iz min is either 0 or a random number)
-            Ir_min = iz_min + Il
-        else:
-            Ir_max = iz_max + Il
-            Ir_min = Il
-            iz_min = 0
-        Vr_max = iz_max * r_values[0]  # Use r1_value
-        Vs_max = Vr_max + vz
-        Vr_min = iz_min * r_values[0]   # Use r1_value
-        Vs_min = Vr_min + vz
-        return True, Il, Vr_max, Vs_max, Vr_min, Vs_min, 0, 0
-
-    elif circuit_type == 'zener_diode3':
-        if vin_peak is None or vz is None:
-            return False, 0, 0, 0, 0, 0, 0, 0
-        r_value = st.session_state.r_value * 1000
-        Vr = vin_peak - vz
-        Ir = Vr / r_value
-        Il_max = Ir - iz_max 
-        if iz_min is not None:
-            Il_min = Ir - iz_min 
-        else:
-            Il_min = Ir
-            iz_min = 0
-        Rl_max = vz / Il_max if Il_max != 0 else float('inf')
-        Rl_min = vz / Il_min if Il_min != 0 else float('inf')
-        return True, Vr, Ir, Il_max, Il_min, Rl_max, Rl_min, 0, 0, 0
 
-    
-    return False, 0, 0, 0, 0
+@st.cache_resource
+def get_problem_bank():
+    """
+    Pregenerated problems from bank.py, memory-mapped so every worker process
+    shares one copy. Set ELECTRA_PROBLEM_BANK to use a file other than problems.bank.
+    """
+    path = os.environ.get('ELECTRA_PROBLEM_BANK', os.path.join(os.path.dirname(__file__), 'problems.bank'))
+    return ProblemBank(path) if os.path.exists(path) else None
 
-        
 
-def setup_circuit(drawer, circuit_type):
-    diode_reversed = True  # Force reverse bias for Zener diodes
-    if circuit_type == 'zener_diode3':
-        vin_peak = round(random.uniform(20.0, 75.0), 1)
-    else:
-        vin_peak = round(random.uniform(5.0, 20.0), 1)
-    
-    if circuit_type in ['series_clipper', 'parallel_clipper', 'nobias_clamper']:
-        diode_reversed = random.choice([True, False])
-        result = drawer.draw_circuit(circuit_type, vin_peak, diode_reversed)
-        return (*result[:3], vin_peak, None, None)
-    
-    elif circuit_type in ['series_biasclipper', 'parallel_biasclipper', 'bias_clamper']:
-        diode_reversed = random.choice([True, False])
-        vbias = random.uniform(2.0, 10.0)
-        vbias_reversed = random.choice([True, False])
-        result = drawer.draw_circuit(circuit_type, vin_peak, diode_reversed, vbias, vbias_reversed)
-        return (*result, vin_peak)
-    
-    elif circuit_type in ['zener_diode1', 'zener_diode2']:
-        # Generate Zener parameters first
-        if random.random() < 0.8:  # 80% of the time
-            vz = round(random.uniform(vin_peak * 0.2, vin_peak * 0.8), 1)
-        else:
-            vz = round(random.uniform(vin_peak * 0.8, vin_peak * 1.2), 1)
-        
-        iz_max = random.uniform(5.0, 30.0)
-        iz_min = random.uniform(1.0, iz_max * 0.2) if random.random() < 0.2 else None  # 20% of the time
-        
-        # Store in session state before drawing
-        st.session_state.vz = vz
-        st.session_state.iz_max = iz_max
-        st.session_state.iz_min = iz_min
-        
-        # Now draw the circuit
-        result = drawer.draw_circuit(circuit_type, vin_peak, True)  # Remove vz parameter
-        
-        if circuit_type == 'zener_diode1':
-            return (*result, vin_peak, None, None, vz, iz_max, iz_min)
-        else:
-            return (*result, vin_peak, None, None, vz, iz_max, iz_min)
-    
-    elif circuit_type == 'zener_diode3':
-        # Generate Zener parameters first
-        if random.random() < 0.8:  # 80% of the time
-            vz = round(random.uniform(vin_peak * 0.2, vin_peak * 0.8), 1)
-        else:
-            vz = round(random.uniform(vin_peak * 0.8, vin_peak * 1.2), 1)
-        
-        iz_max = random.uniform(2.0, 25.0)
-        iz_min = random.uniform(1.0, iz_max * 0.2) if random.random() < 0.2 else None  # 20% of the time
-        
-        # Store in session state before drawing
-        st.session_state.vz = vz
-        st.session_state.iz_max = iz_max
-        st.session_state.iz_min = iz_min
-        
-        # Now draw the circuit
-        result = drawer.draw_circuit(circuit_type, vin_peak, True)  # Remove vz parameter
-        return (*result, vin_peak, None, None, vz, iz_max, iz_min)
-    
-    return None, None, None, None, None, None, None, None, None
+@st.cache_resource
+def get_svg_store():
+    """
+    Where drawings are published for the browser to cache, or None when static
+    serving is off (see .streamlit/config.toml) and SVGs have to be inlined.
+    ELECTRA_PRECOMPRESS_SVG=1 also writes .gz/.br copies for a proxy to serve.
+    """
+    if not st.get_option('server.enableStaticServing'):
+        return None
+    return SvgStore(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'svg'), 'app/static/svg',
+        precompress=os.environ.get('ELECTRA_PRECOMPRESS_SVG') == '1'
+    )
+
+
+@st.cache_resource
+def get_drawer():
+    """
+    One drawer, and so one template cache, for the whole process. With
+    ELECTRA_PRERENDER=1 the first session also starts laying out every topology
+    in the background, which spawns the render workers and fills the cache
+    before the next students need it.
+    """
+    drawer = CircuitDrawer(get_render_service())
+    if os.environ.get('ELECTRA_PRERENDER') == '1':
+        def prerender():
+            try:
+                drawer.prerender_templates()
+            except RenderBusy:
+                pass  # Whatever is left gets drawn on demand
+        threading.Thread(target=prerender, name='prerender', daemon=True).start()
+    return drawer
+
+
+@st.cache_resource
+def get_prefetcher():
+    """Process-wide queue of ready problems, refilled in the background"""
+    return ProblemPrefetcher(get_drawer())
 
 
+ANSWER_PREFIX = 'answer_'
+
+
+def answer_key(slot):
+    """
+    Widget key for an answer field. Keys name the slot (the grid, or a Zener
+    quantity), never the problem, so the set of keys is fixed however many
+    problems a student works through.
+    """
+    return f"{ANSWER_PREFIX}{slot}"
+
+
+def clear_answers():
+    """Drop every answer widget's state so the next problem starts blank"""
+    for key in [key for key in st.session_state if str(key).startswith(ANSWER_PREFIX)]:
+        del st.session_state[key]
+
+
+def setup_circuit(circuit_type, seed=None, svg=None):
+    """
+    Start a new problem. Its circuit type and seed are kept, in the session and
+    in the URL, so a shared link or another replica rebuilds the same problem.
+    `svg` is its drawing if one is already made (e.g. by the prefetcher), so the
+    page doesn't draw it again. The previous problem's answers and results are pruned.
+    """
+    problem = generate_problem(circuit_type, seed)
+    clear_answers()
+    st.session_state.update({
+        'circuit_type': circuit_type,
+        'seed': problem.seed,
+        'svg': svg,
+        'show_results': False,
+        'results': None
+    })
+    st.query_params.update(circuit=circuit_type, seed=f'{problem.seed:x}')
+
+
+def shared_problem():
+    """(circuit_type, seed) from the URL query params, or None if absent or malformed"""
+    circuit_type = st.query_params.get('circuit')
+    try:
+        seed = int(st.query_params.get('seed', ''), 16)
+    except ValueError:
+        return None
+    if circuit_type not in CIRCUIT_TYPES or not 0 <= seed < 2**64:
+        return None
+    return circuit_type, seed
+
+
+def current_problem():
+    if st.session_state.seed is None:
+        return None
+    return generate_problem(st.session_state.circuit_type, st.session_state.seed)
+
+
+
+
+def svg_src(svg_image):
+    """Static URL for the drawing, falling back to an inline data URI"""
+    store = get_svg_store()
+    if store is not None:
+        try:
+            return store.publish(svg_image)
+        except OSError:
+            pass
+    return f'data:image/svg+xml;base64,{base64.b64encode(svg_image).decode()}'
 
 
 def display_circuit(svg_image, r_value, diode_reversed, vbias=None, vbias_reversed=None, vz=None, iz_max=None, iz_min=None):
     if svg_image:
-        st.markdown(
-            f'<img src="data:image/svg+xml;base64,{base64.b64encode(svg_image).decode()}" />',
-            unsafe_allow_html=True
-        )
+        st.markdown(f'<img src="{svg_src(svg_image)}" />', unsafe_allow_html=True)
         
         if isinstance(r_value, tuple):
             st.write(f"Resistors: R1={to_engineering_notation(r_value[0]*1000, 'Ω')}, R2={to_engineering_notation(r_value[1]*1000, 'Ω')}")
@@ -559,77 +266,75 @@ def display_circuit(svg_image, r_value, diode_reversed, vbias=None, vbias_revers
 
 
 
-def display_form(vin_peak, diode_reversed, circuit_type='series_clipper', vbias=None, vbias_reversed=None):
+def answer_grid(problem, with_fb):
+    """
+    The Vin / D / Vo answer table as one editable grid. Returns the Vin column
+    and the student's diode states (None without a D column) and Vout values.
+    """
+    vins = table_vins(problem.vin_peak)
+    columns = {'vin': vins}
+    if with_fb:
+        columns['fb'] = [False] * len(vins)
+    columns['vo'] = [0.0] * len(vins)
+
+    grid = st.data_editor(
+        columns,
+        key=answer_key('grid'),
+        hide_index=True,
+        disabled=['vin'],
+        column_config={
+            'vin': st.column_config.NumberColumn("Vin (V)", format="%.1f"),
+            'fb': st.column_config.CheckboxColumn("D (FB)"),
+            'vo': st.column_config.NumberColumn("Vo (V)", step=0.1, format="%.1f"),
+        }
+    )
+    user_fbs = [bool(fb) for fb in grid['fb']] if with_fb else None
+    user_vouts = [0.0 if vo is None else vo for vo in grid['vo']]
+    return vins, user_fbs, user_vouts
+
+
+def display_form(problem, diode_model=None):
+    vin_peak, diode_reversed, circuit_type = problem.vin_peak, problem.diode_reversed, problem.circuit_type
+    vbias, vbias_reversed = problem.vbias, problem.vbias_reversed
     with st.form(key='input_form'):
         if circuit_type in ['nobias_clamper', 'bias_clamper']:
             # Simplified form for clamper circuits (no D column needed)
-            cols = st.columns([1, 1])
-            cols[0].markdown("<div style='text-align: center'><b>Vin (V)</b></div>", unsafe_allow_html=True)
-            cols[1].markdown("<div style='text-align: center'><b>Vo (V)</b></div>", unsafe_allow_html=True)
-            
-            data = [vin_peak, vin_peak - 2.5, 0, -(vin_peak - 2.5), -vin_peak]
-            table_data = []
-            
-            for vin in data:
-                with st.container():
-                    cols = st.columns([1, 1])
-                    
-                    # Vin value
-                    with cols[0]:
-                        st.markdown(
-                            f"<div style='display: flex; align-items: center; height: 100%'>"
-                            f"<div style='width: 100%; text-align: center; padding-top:20px'>{vin:.1f}</div>"
-                            f"</div>",
-                            unsafe_allow_html=True
-                        )
-                    
-                    # Number input
-                    with cols[1]:
-                        st.markdown(
-                            "<div style='display: flex; justify-content: center; align-items: center; height: 100%'>",
-                            unsafe_allow_html=True
-                        )
-                        vout_input = st.number_input(
-                            "Vout", 
-                            key=f"vout_{vin}_{circuit_type}", 
-                            label_visibility="collapsed",
-                            step=0.1,
-                            format="%.1f"
-                        )
-                        st.markdown("</div>", unsafe_allow_html=True)
-                    
-                    table_data.append([vin, vout_input])
+            vins, _, user_vouts = answer_grid(problem, with_fb=False)
             
             if st.form_submit_button("Check"):
+                _, correct_vouts = calculate_correct_values_batch(
+                    vins, diode_reversed, circuit_type, vbias, vbias_reversed, vin_peak,
+                    diode_model=diode_model, r_value=problem.r_value
+                )
+                is_correct = np.abs(np.asarray(user_vouts, dtype=float) - correct_vouts) < 0.1
                 results = []
-                for vin, user_vout in table_data:
-                    correct_fb, correct_vout = calculate_correct_values(
-                        vin, diode_reversed, circuit_type, vbias, vbias_reversed, vin_peak
-                    )
-                    is_correct = abs(float(user_vout) - correct_vout) < 0.1
+                for vin, user_vout, correct_vout, vout_ok in zip(vins, user_vouts, correct_vouts.tolist(), is_correct.tolist()):
                     results.append({
                         "Vin": vin,
                         "Your Vout": user_vout,
                         "Correct Vout": correct_vout,
-                        "Is Correct": is_correct
+                        "Is Correct": vout_ok
                     })
                 return results
 
         elif circuit_type == 'zener_diode1':
             # Custom form for zener_diode1
             st.subheader("Zener Diode (Basic) Parameters")
-            I = st.number_input("Current (I)", min_value=0.0, step=0.1)
-            Pr = st.number_input("Power across Resistor (Pr)", min_value=0.0, step=0.1)
-            Pz = st.number_input("Power across Zener (Pz)", min_value=0.0, step=0.1)
-            Vr = st.number_input("Voltage across Resistor (Vr)", min_value=0.0, step=0.1)
+            I = engineering_input("Current (I)", 'A', 'I')
+            Pr = engineering_input("Power across Resistor (Pr)", 'W', 'Pr')
+            Pz = engineering_input("Power across Zener (Pz)", 'W', 'Pz')
+            Vr = engineering_input("Voltage across Resistor (Vr)", 'V', 'Vr')
             
             if st.form_submit_button("Check"):
+                if unreadable(I, Pr, Pz, Vr):
+                    return None
                 correct_values = calculate_correct_values(
                     vin_peak, diode_reversed, circuit_type, 
                     vin_peak=vin_peak, 
-                    vz=st.session_state.vz,
-                    iz_max=st.session_state.iz_max,
-                    iz_min=st.session_state.iz_min
+                    vz=problem.vz,
+                    iz_max=problem.iz_max,
+                    iz_min=problem.iz_min,
+                    r_value=problem.r_value
                 )
                 results = [{
                     "ZenerDiode1": {
@@ -637,8 +342,8 @@ def display_form(vin_peak, diode_reversed, circuit_type='series_clipper', vbias=
                         "Ir": I,
                         "Pr": Pr,
                         "Pz": Pz,
-                        "Iz_max": st.session_state.iz_max,
-                        "Iz_min": st.session_state.iz_min,
+                        "Iz_max": problem.iz_max,
+                        "Iz_min": problem.iz_min,
                         "Correct Vr": correct_values[1],
                         "Correct Ir": correct_values[2],
                         "Correct Pr": correct_values[3],
@@ -652,31 +357,34 @@ def display_form(vin_peak, diode_reversed, circuit_type='series_clipper', vbias=
             st.subheader("Zener Diode (Two Resistors) Parameters")
             
             st.markdown("**General Parameters**")
-            Il = st.number_input("Load Current (Il)", min_value=0.0, step=0.1)
-            Iz_max = st.number_input("Zener Max Current (Iz(max))", min_value=0.0, step=0.1)
-            Iz_min = st.number_input("Zener Min Current (Iz(min))", min_value=0.0, step=0.1)
+            Il = engineering_input("Load Current (Il)", 'A', 'Il')
+            Iz_max = engineering_input("Zener Max Current (Iz(max))", 'A', 'Iz_max')
+            Iz_min = engineering_input("Zener Min Current (Iz(min))", 'A', 'Iz_min')
             
             st.markdown("**At Iz(max)**")
             col1, col2 = st.columns(2)
             with col1:
-                Vr_max = st.number_input("Vr at Iz(max)", min_value=0.0, step=0.1)
+                Vr_max = engineering_input("Vr at Iz(max)", 'V', 'Vr_max')
             with col2:
-                Vs_max = st.number_input("Vs at Iz(max)", min_value=0.0, step=0.1)
+                Vs_max = engineering_input("Vs at Iz(max)", 'V', 'Vs_max')
             
             st.markdown("**At Iz(min)**")
             col1, col2 = st.columns(2)
             with col1:
-                Vr_min = st.number_input("Vr at Iz(min)", min_value=0.0, step=0.1)
+                Vr_min = engineering_input("Vr at Iz(min)", 'V', 'Vr_min')
             with col2:
-                Vs_min = st.number_input("Vs at Iz(min)", min_value=0.0, step=0.1)
+                Vs_min = engineering_input("Vs at Iz(min)", 'V', 'Vs_min')
             
             if st.form_submit_button("Check"):
+                if unreadable(Il, Iz_max, Iz_min, Vr_max, Vs_max, Vr_min, Vs_min):
+                    return None
                 correct_values = calculate_correct_values(
                     vin_peak, diode_reversed, circuit_type, 
                     vin_peak=vin_peak, 
-                    vz=st.session_state.vz,
-                    iz_max=st.session_state.iz_max,
-                    iz_min=st.session_state.iz_min,
+                    vz=problem.vz,
+                    iz_max=problem.iz_max,
+                    iz_min=problem.iz_min,
+                    r_value=problem.r_value
                 )
                 results = [{
                     "ZenerDiode2": {
@@ -684,8 +392,8 @@ def display_form(vin_peak, diode_reversed, circuit_type='series_clipper', vbias=
                         "Vs_max": Vs_max,
                         "Vr_min": Vr_min,
                         "Vs_min": Vs_min,
-                        "Iz_max": st.session_state.iz_max,
-                        "Iz_min": st.session_state.iz_min,
+                        "Iz_max": problem.iz_max,
+                        "Iz_min": problem.iz_min,
                         "Il": Il,
                         "Correct Il": correct_values[1],
                         "Correct Vr_max": correct_values[2],
@@ -702,32 +410,35 @@ def display_form(vin_peak, diode_reversed, circuit_type='series_clipper', vbias=
             st.subheader("Zener Diode (Variable Resistor) Parameters")
             
             st.markdown("**General Parameters**")
-            Vr = st.number_input("Voltage across Resistor (Vr)", min_value=0.0, step=0.1)
-            Ir = st.number_input("Current through Resistor (Ir)", min_value=0.0, step=0.1)
-            Iz_max = st.number_input("Zener Max Current (Iz(max))", min_value=0.0, step=0.1)
-            Iz_min = st.number_input("Zener Min Current (Iz(min))", min_value=0.0, step=0.1)
+            Vr = engineering_input("Voltage across Resistor (Vr)", 'V', 'Vr')
+            Ir = engineering_input("Current through Resistor (Ir)", 'A', 'Ir')
+            Iz_max = engineering_input("Zener Max Current (Iz(max))", 'A', 'Iz_max')
+            Iz_min = engineering_input("Zener Min Current (Iz(min))", 'A', 'Iz_min')
             
             st.markdown("**At Iz(max)**")
             col1, col2 = st.columns(2)
             with col1:
-                Il_max = st.number_input("Load Current at Iz(max)", min_value=0.0, step=0.1)
+                Il_max = engineering_input("Load Current at Iz(max)", 'A', 'Il_max')
             with col2:
-                Rl_max = st.number_input("Load Resistance at Iz(max)", min_value=0.0, step=0.1)
+                Rl_max = engineering_input("Load Resistance at Iz(max)", 'Ω', 'Rl_max')
             
             st.markdown("**At Iz(min)**")
             col1, col2 = st.columns(2)
             with col1:
-                Il_min = st.number_input("Load Current at Iz(min)", min_value=0.0, step=0.1)
+                Il_min = engineering_input("Load Current at Iz(min)", 'A', 'Il_min')
             with col2:
-                Rl_min = st.number_input("Load Resistance at Iz(min)", min_value=0.0, step=0.1)
+                Rl_min = engineering_input("Load Resistance at Iz(min)", 'Ω', 'Rl_min')
             
             if st.form_submit_button("Check"):
+                if unreadable(Vr, Ir, Iz_max, Iz_min, Il_max, Rl_max, Il_min, Rl_min):
+                    return None
                 correct_values = calculate_correct_values(
                     vin_peak, diode_reversed, circuit_type, 
                     vin_peak=vin_peak, 
-                    vz=st.session_state.vz,
-                    iz_max=st.session_state.iz_max,
-                    iz_min=st.session_state.iz_min
+                    vz=problem.vz,
+                    iz_max=problem.iz_max,
+                    iz_min=problem.iz_min,
+                    r_value=problem.r_value
                 )
                 results = [{
                     "ZenerDiode3": {
@@ -735,8 +446,8 @@ def display_form(vin_peak, diode_reversed, circuit_type='series_clipper', vbias=
                         "Ir": Ir,
                         "Rl_max": Rl_max,
                         "Rl_min": Rl_min,
-                        "Iz_max": st.session_state.iz_max,
-                        "Iz_min": st.session_state.iz_min,
+                        "Iz_max": problem.iz_max,
+                        "Iz_min": problem.iz_min,
                         "Il_max": Il_max,  # From form inputs
                         "Il_min": Il_min,  # From form inputs
                         "Correct Vr": correct_values[1],
@@ -756,67 +467,25 @@ def display_form(vin_peak, diode_reversed, circuit_type='series_clipper', vbias=
 
         else:
             # Default form for clipper circuits
-            cols = st.columns([1, 1, 2])
-            cols[0].markdown("<div style='text-align: center'><b>Vin (V)</b></div>", unsafe_allow_html=True)
-            cols[1].markdown("<div style='text-align: center'><b>D</b></div>", unsafe_allow_html=True)
-            cols[2].markdown("<div style='text-align: center'><b>Vo (V)</b></div>", unsafe_allow_html=True)
-            
-            data = [vin_peak, vin_peak - 2.5, 0, -(vin_peak - 2.5), -vin_peak]
-            table_data = []
-            
-            for vin in data:
-                with st.container():
-                    cols = st.columns([1, 1, 2])
-                    
-                    # Vin value
-                    with cols[0]:
-                        st.markdown(
-                            f"<div style='display: flex; align-items: center; height: 100%'>"
-                            f"<div style='width: 100%; text-align: center; padding-top:20px'>{vin:.1f}</div>"
-                            f"</div>",
-                            unsafe_allow_html=True
-                        )
-                    
-                    # Checkbox
-                    with cols[1]:
-                        st.markdown(
-                            "<div style='display: flex; justify-content: center; align-items: center; height: 100%'>",
-                            unsafe_allow_html=True
-                        )
-                        fb_checkbox = st.checkbox("FB", key=f"fb_{vin}_{circuit_type}", label_visibility="collapsed")
-                        st.markdown("</div>", unsafe_allow_html=True)
-                    
-                    # Number input
-                    with cols[2]:
-                        st.markdown(
-                            "<div style='display: flex; justify-content: center; align-items: center; height: 100%'>",
-                            unsafe_allow_html=True
-                        )
-                        vout_input = st.number_input(
-                            "Vout", 
-                            key=f"vout_{vin}_{circuit_type}", 
-                            label_visibility="collapsed",
-                            step=0.1,
-                            format="%.1f"
-                        )
-                        st.markdown("</div>", unsafe_allow_html=True)
-                    
-                    table_data.append([vin, fb_checkbox, vout_input])
+            vins, user_fbs, user_vouts = answer_grid(problem, with_fb=True)
             
             if st.form_submit_button("Check"):
+                correct_fbs, correct_vouts = calculate_correct_values_batch(
+                    vins, diode_reversed, circuit_type, vbias, vbias_reversed, vin_peak,
+                    diode_model=diode_model, r_value=problem.r_value
+                )
+                is_correct = (np.abs(np.asarray(user_vouts, dtype=float) - correct_vouts) < 0.1) & (np.asarray(user_fbs) == correct_fbs)
                 results = []
-                for vin, user_fb, user_vout in table_data:
-                    correct_fb, correct_vout = calculate_correct_values(
-                        vin, diode_reversed, circuit_type, vbias, vbias_reversed, vin_peak
-                    )
-                    is_correct = (abs(float(user_vout) - correct_vout) < 0.1) and (user_fb == correct_fb)
+                for vin, user_fb, user_vout, correct_fb, correct_vout, row_ok in zip(
+                    vins, user_fbs, user_vouts, correct_fbs.tolist(), correct_vouts.tolist(), is_correct.tolist()
+                ):
                     results.append({
                         "Vin": vin,
                         "Your FB": "FB" if user_fb else "RB",
                         "Correct FB": "FB" if correct_fb else "RB",
                         "Your Vout": user_vout,
                         "Correct Vout": correct_vout,
-                        "Is Correct": is_correct
+                        "Is Correct": row_ok
                     })
                 return results
     
@@ -824,93 +493,226 @@ def display_form(vin_peak, diode_reversed, circuit_type='series_clipper', vbias=
 
 
 
+ZENER_RESULT_ROWS = {
+    # result key: (subheader, [(label, your key, correct key, unit)]); a None
+    # "your key" marks a given value that is shown but not answered
+    'ZenerDiode1': ("Zener Diode (Basic) Results", [
+        ('Vr', 'Vr', 'Correct Vr', 'V'),
+        ('Ir', 'Ir', 'Correct Ir', 'A'),
+        ('Pr', 'Pr', 'Correct Pr', 'W'),
+        ('Pz', 'Pz', 'Correct Pz', 'W'),
+        ('Iz_max', None, 'Iz_max', 'A'),
+        ('Iz_min', None, 'Iz_min', 'A'),
+    ]),
+    'ZenerDiode2': ("Zener Diode (Two Resistors) Results", [
+        ('Vr_max', 'Vr_max', 'Correct Vr_max', 'V'),
+        ('Vs_max', 'Vs_max', 'Correct Vs_max', 'V'),
+        ('Vr_min', 'Vr_min', 'Correct Vr_min', 'V'),
+        ('Vs_min', 'Vs_min', 'Correct Vs_min', 'V'),
+        ('Il', 'Il', 'Correct Il', 'A'),
+        ('Iz_max', None, 'Iz_max', 'A'),
+        ('Iz_min', None, 'Iz_min', 'A'),
+    ]),
+    'ZenerDiode3': ("Zener Diode (Variable Resistor) Results", [
+        ('Vr', 'Vr', 'Correct Vr', 'V'),
+        ('Ir', 'Ir', 'Correct Ir', 'A'),
+        ('Il_max', 'Il_max', 'Correct Il_max', 'A'),
+        ('Il_min', 'Il_min', 'Correct Il_min', 'A'),
+        ('Rl_max', 'Rl_max', 'Correct Rl_max', 'Ω'),
+        ('Rl_min', 'Rl_min', 'Correct Rl_min', 'Ω'),
+    ]),
+}
+
+
+def results_table(headers, rows):
+    """One HTML table for a whole result set; cells are text or (text, color)"""
+    out = ["<table style='width: 100%; text-align: center'><tr>"]
+    out.extend(f"<th style='text-align: center'>{header}</th>" for header in headers)
+    out.append("</tr>")
+    for row in rows:
+        out.append("<tr>")
+        for cell in row:
+            if isinstance(cell, tuple):
+                out.append(f"<td style='color:{cell[1]}'>{cell[0]}</td>")
+            else:
+                out.append(f"<td>{cell}</td>")
+        out.append("</tr>")
+    out.append("</table>")
+    st.markdown(''.join(out), unsafe_allow_html=True)
+
+
 def display_results(results):
     if not results:
         return
-    
-    if isinstance(results[0], dict) and "ZenerDiode1" in results[0]:
-        st.subheader("Zener Diode (Basic) Results")
-        result = results[0]["ZenerDiode1"]
-        cols = st.columns(2)
-        with cols[0]:
-            st.write(f"Vr: {to_engineering_notation(result['Vr'], 'V')} (Correct: {to_engineering_notation(result['Correct Vr'], 'V')})")
-            st.write(f"Ir: {to_engineering_notation(result['Ir'], 'A')} (Correct: {to_engineering_notation(result['Correct Ir'], 'A')})")
-        with cols[1]:
-            st.write(f"Iz_max: {to_engineering_notation(result['Iz_max'], 'A')}")
-            st.write(f"Iz_min: {to_engineering_notation(result['Iz_min'], 'A') if result['Iz_min'] is not None else 'N/A'}")
-        st.write(f"Pr: {to_engineering_notation(result['Pr'], 'W')} (Correct: {to_engineering_notation(result['Correct Pr'], 'W')})")
-        st.write(f"Pz: {to_engineering_notation(result['Pz'], 'W')} (Correct: {to_engineering_notation(result['Correct Pz'], 'W')})")
-    
-    elif isinstance(results[0], dict) and "ZenerDiode2" in results[0]:
-        st.subheader("Zener Diode (Two Resistors) Results")
-        result = results[0]["ZenerDiode2"]
-        cols = st.columns(2)
-        with cols[0]:
-            st.write(f"Vr_max: {to_engineering_notation(result['Vr_max'], 'V')} (Correct: {to_engineering_notation(result['Correct Vr_max'], 'V')})")
-            st.write(f"Vs_max: {to_engineering_notation(result['Vs_max'], 'V')} (Correct: {to_engineering_notation(result['Correct Vs_max'], 'V')})")
-            st.write(f"Iz_max: {to_engineering_notation(result['Iz_max'], 'A')}") 
-            st.write(f"Il: {to_engineering_notation(result['Il'], 'A')} (Correct: {to_engineering_notation(result['Correct Il'], 'A')})")
-        with cols[1]:
-            st.write(f"Vr_min: {to_engineering_notation(result['Vr_min'], 'V')} (Correct: {to_engineering_notation(result['Correct Vr_min'], 'V')})")
-            st.write(f"Vs_min: {to_engineering_notation(result['Vs_min'], 'V')} (Correct: {to_engineering_notation(result['Correct Vs_min'], 'V')})")
-            st.write(f"Iz_min: {to_engineering_notation(result['Iz_min'], 'A') if result['Iz_min'] is not None else 'N/A'}")
-    
-    elif isinstance(results[0], dict) and "ZenerDiode3" in results[0]:
-        st.subheader("Zener Diode (Variable Resistor) Results")
-        result = results[0]["ZenerDiode3"]
-        cols = st.columns(2)
-        with cols[0]:
-            st.write(f"Vr: {to_engineering_notation(result['Vr'], 'V')} (Correct: {to_engineering_notation(result['Correct Vr'], 'V')})")
-            st.write(f"Ir: {to_engineering_notation(result['Ir'], 'A')} (Correct: {to_engineering_notation(result['Correct Ir'], 'A')})")
-        with cols[1]:
-            st.write(f"Il_max: {to_engineering_notation(result['Il_max'], 'A')} (Correct: {to_engineering_notation(result['Correct Il_max'], 'A')})")
-            st.write(f"Il_min: {to_engineering_notation(result['Il_min'], 'A') if result['Il_min'] is not None else 'N/A'} (Correct: {to_engineering_notation(result['Correct Il_min'], 'A')})")
-        st.write(f"Rl_max: {to_engineering_notation(result['Rl_max'], 'Ω')} (Correct: {to_engineering_notation(result['Correct Rl_max'], 'Ω')})")
-        st.write(f"Rl_min: {to_engineering_notation(result['Rl_min'], 'Ω')} (Correct: {to_engineering_notation(result['Correct Rl_min'], 'Ω')})")
 
-        
-    elif "Your FB" in results[0]:  # For clipper circuits
-        st.subheader("Results")
-        for result in results:
-            fb_color = "green" if result["Your FB"] == result["Correct FB"] else "red"
-            vout_color = "green" if abs(float(result["Your Vout"]) - result["Correct Vout"]) < 0.1 else "red"
-            st.markdown(
-                f"Vin = {result['Vin']:.1f}V | "
-                f"Your FB: <span style='color:{fb_color}'>{result['Your FB']}</span> | "
-                f"Correct FB: {result['Correct FB']} | "
-                f"Your Vout: <span style='color:{vout_color}'>{result['Your Vout']}</span> | "
-                f"Correct Vout: {result['Correct Vout']:.1f}",
-                unsafe_allow_html=True
-            )
+    zener_key = next((key for key in ZENER_RESULT_ROWS if isinstance(results[0], dict) and key in results[0]), None)
+    if zener_key:
+        title, spec = ZENER_RESULT_ROWS[zener_key]
+        result = results[0][zener_key]
+        labels, yours, correct, units = zip(*spec)
+
+        def column(keys):
+            # The whole column in one call; None (or no answer field at all) stays text
+            values = [np.nan if key is None or result[key] is None else result[key] for key in keys]
+            texts = to_engineering_notation_array(values, units)
+            return ["" if not key else 'N/A' if value != value else text for key, value, text in zip(keys, values, texts)]
+
+        st.subheader(title)
+        results_table(["", "Yours", "Correct"], zip(labels, column(yours), column(correct)))
+        return
+
+    # Grade every row in one pass, then render the set as a single table
+    your_vouts = np.array([float(result["Your Vout"]) for result in results])
+    correct_vouts = np.array([result["Correct Vout"] for result in results])
+    vout_colors = np.where(np.abs(your_vouts - correct_vouts) < 0.1, "green", "red").tolist()
+
+    st.subheader("Results")
+    if "Your FB" in results[0]:  # For clipper circuits
+        fb_colors = np.where(
+            np.array([result["Your FB"] for result in results]) == np.array([result["Correct FB"] for result in results]),
+            "green", "red"
+        ).tolist()
+        results_table(["Vin", "Your FB", "Correct FB", "Your Vout", "Correct Vout"], [
+            (f"{result['Vin']:.1f}V", (result['Your FB'], fb_color), result['Correct FB'],
+             (result['Your Vout'], vout_color), f"{result['Correct Vout']:.1f}")
+            for result, fb_color, vout_color in zip(results, fb_colors, vout_colors)
+        ])
     else:  # For clamper circuits
-        st.subheader("Results")
-        for result in results:
-            vout_color = "green" if abs(float(result["Your Vout"]) - result["Correct Vout"]) < 0.1 else "red"
-            st.markdown(
-                f"Vin = {result['Vin']:.1f}V | "
-                f"Your Vout: <span style='color:{vout_color}'>{result['Your Vout']}</span> | "
-                f"Correct Vout: {result['Correct Vout']:.1f}",
-                unsafe_allow_html=True
-            )
+        results_table(["Vin", "Your Vout", "Correct Vout"], [
+            (f"{result['Vin']:.1f}V", (result['Your Vout'], vout_color), f"{result['Correct Vout']:.1f}")
+            for result, vout_color in zip(results, vout_colors)
+        ])
+
+
+def display_waveform(problem, diode_model=None):
+    """
+    Vin and Vo over a sinusoidal input, decimated to a few hundred points.
+    Clampers are simulated from an uncharged capacitor for a chosen C and
+    frequency, so the charge-up and the droop between peaks show.
+    """
+    st.subheader("Waveforms")
+    if problem.circuit_type.endswith('clamper'):
+        c_col, f_col = st.columns(2)
+        capacitance = c_col.number_input("C (µF)", min_value=0.001, max_value=10000.0, value=1.0, key='clamper_c')
+        frequency = f_col.number_input(
+            "Frequency (Hz)", min_value=1.0, max_value=1e6, value=1000.0, key='clamper_f'
+        )
+        t, vin, vo = clamper_waveform(problem, capacitance, frequency, diode_model)
+        rc = problem.r_value * capacitance  # kΩ * µF = ms
+        st.caption(f"RC = {rc:.3g} ms, {rc * frequency / 1000:.3g} input periods")
+    else:
+        t, vin, vo = waveform(problem, diode_model)
+    st.line_chart(
+        {'t (periods)': t, 'Vin': vin, 'Vo': vo},
+        x='t (periods)', y=['Vin', 'Vo'], x_label="t (periods)", y_label="V"
+    )
+
+
+NAV_BUTTONS = [
+    # CLIPPER CIRCUIT -------------
+    [('Series Clipper', 'series_clipper'),
+     ('Series Bias Clipper', 'series_biasclipper'),
+     ('Parallel Clipper', 'parallel_clipper'),
+     ('Parallel Bias Clipper', 'parallel_biasclipper')],
+    # CLAMPER CIRCUIT -------------
+    [('No Bias Clamper', 'nobias_clamper'),
+     ('Bias Clamper', 'bias_clamper')],
+    # ZENER DIODE -------------
+    [('Zener Diode (Basic)', 'zener_diode1'),
+     ('Zener Diode (Two Resistors)', 'zener_diode2'),
+     ('Zener Diode (Variable Resistor)', 'zener_diode3')]
+]
+
+
+@st.fragment
+def nav_panel():
+    """Problem picker. A click reruns only this panel until the new problem is set up."""
+    for i, group in enumerate(NAV_BUTTONS):
+        if i:
+            st.divider()
+        for label, circuit_type in group:
+            if st.button(label):
+                bank = get_problem_bank()
+                problem = bank.random_problem(circuit_type) if bank else None
+                svg = None
+                try:
+                    if problem is None:
+                        problem, svg = get_prefetcher().take(circuit_type)
+                    seed = problem.seed
+                except RenderBusy:
+                    seed = None  # Still start the problem; its diagram follows once drawn
+                setup_circuit(circuit_type, seed, svg)
+                st.rerun(scope='app')
+
+
+@st.fragment
+def circuit_panel(problem):
+    """Diagram and component values; only redrawn when the whole page reruns"""
+    drawer = get_drawer()
+    bank = get_problem_bank()
+    try:
+        svg_image = st.session_state.svg or (bank and bank.svg(problem)) or drawer.draw_problem(problem)
+    except RenderBusy:
+        st.warning("Lots of circuits are being drawn right now, the diagram will appear on the next refresh.")
+        svg_image = None
+
+    display_circuit(
+        svg_image,
+        problem.r_value,
+        problem.diode_reversed,
+        problem.vbias,
+        problem.vbias_reversed,
+        problem.vz,
+        problem.iz_max,
+        problem.iz_min
+    )
+
+
+DIODE_MODEL_LABELS = {
+    'ideal': "Ideal",
+    'constant': "Constant drop (0.7 V)",
+    'pwl': "Piecewise linear (0.6 V + 10 Ω)",
+    'shockley': "Shockley equation",
+}
+
+
+@st.fragment
+def answer_panel(problem):
+    """Answer form and its results. Submitting "Check" reruns only this panel."""
+    diode_model = None
+    if problem.circuit_type in TRANSFER_CIRCUITS:
+        choice = st.selectbox(
+            "Diode model", list(DIODE_MODEL_LABELS), format_func=DIODE_MODEL_LABELS.get, key='diode_model',
+            # Results graded under another model would be misleading
+            on_change=lambda: st.session_state.update(show_results=False)
+        )
+        diode_model = DIODE_MODELS[choice]
+    results = display_form(problem, diode_model)
+    if results:
+        st.session_state.results = results
+        st.session_state.show_results = True
+
+    if st.session_state.show_results and st.session_state.results:
+        display_results(st.session_state.results)
+        if problem.circuit_type in TRANSFER_CIRCUITS:
+            # Only after checking, since the Vo curve gives the table away
+            display_waveform(problem, diode_model)
+
 
 def main():
-    drawer = CircuitDrawer()
-    
-    if 'svg_image' not in st.session_state:
+    get_drawer()  # Warm it (and start any prerender) on the very first page load
+
+    if 'seed' not in st.session_state:
         st.session_state.update({
-            'svg_image': None,
-            'r_value': None,
-            'diode_reversed': None,
-            'vin_peak': random.uniform(5.0, 20.0),
-            'vbias': None,
-            'vbias_reversed': None,
-            'vz': None,
-            'iz_max': None,
-            'iz_min': None,
+            'circuit_type': None,
+            'seed': None,
+            'svg': None,
             'show_results': False,
-            'results': None,
-            'circuit_type': None
+            'results': None
         })
+        shared = shared_problem()
+        if shared:
+            setup_circuit(*shared)
 
     colMain, colNav = st.columns([3, 1])
     
@@ -920,182 +722,13 @@ def main():
         
         st.info('Disregard Iz_max if Zener Diode (Basic)', icon="ℹ️")
         
-        if st.session_state.svg_image:
-            display_circuit(
-                st.session_state.svg_image, 
-                st.session_state.r_value, 
-                st.session_state.diode_reversed,
-                st.session_state.vbias,
-                st.session_state.vbias_reversed,
-                st.session_state.vz,
-                st.session_state.iz_max,
-                st.session_state.iz_min
-            )
-            
-            results = display_form(
-                st.session_state.vin_peak, 
-                st.session_state.diode_reversed, 
-                st.session_state.circuit_type,
-                st.session_state.vbias,
-                st.session_state.vbias_reversed
-            )
-
-            if results:
-                st.session_state.results = results
-                st.session_state.show_results = True
-                st.rerun()
-                
-            if st.session_state.show_results and st.session_state.results:
-                display_results(st.session_state.results)
+        problem = current_problem()
+        if problem:
+            circuit_panel(problem)
+            answer_panel(problem)
 
     with colNav:
-        # CLIPPER CIRCUIT -------------
-        if st.button('Series Clipper'):
-            svg_image, r_value, diode_reversed, vin_peak, _, _ = setup_circuit(drawer, 'series_clipper')
-            if svg_image:
-                st.session_state.svg_image = svg_image
-                st.session_state.r_value = r_value
-                st.session_state.diode_reversed = diode_reversed
-                st.session_state.vin_peak = vin_peak
-                st.session_state.vbias = None
-                st.session_state.vbias_reversed = None
-                st.session_state.circuit_type = 'series_clipper'
-                st.session_state.show_results = False
-                st.session_state.results = None
-                st.rerun()
-
-        if st.button('Series Bias Clipper'):
-            svg_image, r_value, diode_reversed, vin_peak, vbias, vbias_reversed = setup_circuit(drawer, 'series_biasclipper')
-            if svg_image:
-                st.session_state.svg_image = svg_image
-                st.session_state.r_value = r_value
-                st.session_state.diode_reversed = diode_reversed
-                st.session_state.vin_peak = vin_peak
-                st.session_state.vbias = vbias
-                st.session_state.vbias_reversed = vbias_reversed
-                st.session_state.circuit_type = 'series_biasclipper'
-                st.session_state.show_results = False
-                st.session_state.results = None
-                st.rerun()
-
-        if st.button('Parallel Clipper'):
-            svg_image, r_value, diode_reversed, vin_peak, _, _ = setup_circuit(drawer, 'parallel_clipper')
-            if svg_image:
-                st.session_state.svg_image = svg_image
-                st.session_state.r_value = r_value
-                st.session_state.diode_reversed = diode_reversed
-                st.session_state.vin_peak = vin_peak
-                st.session_state.vbias = None
-                st.session_state.vbias_reversed = None
-                st.session_state.circuit_type = 'parallel_clipper'
-                st.session_state.show_results = False
-                st.session_state.results = None
-                st.rerun()
-                
-        if st.button('Parallel Bias Clipper'):
-            svg_image, r_value, diode_reversed, vin_peak, vbias, vbias_reversed = setup_circuit(drawer, 'parallel_biasclipper')
-            if svg_image:
-                st.session_state.svg_image = svg_image
-                st.session_state.r_value = r_value
-                st.session_state.diode_reversed = diode_reversed
-                st.session_state.vin_peak = vin_peak
-                st.session_state.vbias = vbias
-                st.session_state.vbias_reversed = vbias_reversed
-                st.session_state.circuit_type = 'parallel_biasclipper'
-                st.session_state.show_results = False
-                st.session_state.results = None
-                st.rerun()
-        
-        st.divider()
-        
-        # CLAMPER CIRCUIT -------------
-        
-        if st.button('No Bias Clamper'):
-            svg_image, r_value, diode_reversed, vin_peak, _, _ = setup_circuit(drawer, 'nobias_clamper')
-            if svg_image:
-                st.session_state.svg_image = svg_image
-                st.session_state.r_value = r_value
-                st.session_state.diode_reversed = diode_reversed
-                st.session_state.vin_peak = vin_peak
-                st.session_state.vbias = None
-                st.session_state.vbias_reversed = None
-                st.session_state.circuit_type = 'nobias_clamper'
-                st.session_state.show_results = False
-                st.session_state.results = None
-                st.rerun()
-        
-        if st.button('Bias Clamper'):
-            svg_image, r_value, diode_reversed, vin_peak, vbias, vbias_reversed = setup_circuit(drawer, 'bias_clamper')
-            if svg_image:
-                st.session_state.svg_image = svg_image
-                st.session_state.r_value = r_value
-                st.session_state.diode_reversed = diode_reversed
-                st.session_state.vin_peak = vin_peak
-                st.session_state.vbias = vbias
-                st.session_state.vbias_reversed = vbias_reversed
-                st.session_state.circuit_type = 'bias_clamper'
-                st.session_state.show_results = False
-                st.session_state.results = None
-                st.rerun()       
-        
-        st.divider()
-        if st.button('Zener Diode (Basic)'):
-            setup_result = setup_circuit(drawer, 'zener_diode1')
-            if setup_result[0]:
-                svg_image, r_value, diode_reversed, vin_peak, _, _, vz, iz_max, iz_min = setup_result
-                st.session_state.update({
-                    'svg_image': svg_image,
-                    'r_value': r_value,
-                    'diode_reversed': diode_reversed,
-                    'vin_peak': vin_peak,
-                    'vz': vz,  # Ensure vz is stored
-                    'iz_max': iz_max,
-                    'iz_min': iz_min,
-                    'circuit_type': 'zener_diode1',
-                    'show_results': False,
-                    'results': None
-                })
-                st.rerun()
-
-        if st.button('Zener Diode (Two Resistors)'):
-            setup_result = setup_circuit(drawer, 'zener_diode2')
-            if setup_result[0]:  # Check if svg_image exists
-                svg_image, r_values, diode_reversed, vin_peak, _, _, vz, iz_max, iz_min = setup_result
-                st.session_state.update({
-                    'svg_image': svg_image,
-                    'r_value': r_values,
-                    'diode_reversed': diode_reversed,
-                    'vin_peak': vin_peak,
-                    'vbias': None,
-                    'vbias_reversed': None,
-                    'vz': vz,
-                    'iz_max': iz_max,
-                    'iz_min': iz_min,
-                    'circuit_type': 'zener_diode2',
-                    'show_results': False,
-                    'results': None
-                })
-                st.rerun()
-
-        if st.button('Zener Diode (Variable Resistor)'):
-            setup_result = setup_circuit(drawer, 'zener_diode3')
-            if setup_result[0]:  # Check if svg_image exists
-                svg_image, r_value, diode_reversed, vin_peak, _, _, vz, iz_max, iz_min = setup_result
-                st.session_state.update({
-                    'svg_image': svg_image,
-                    'r_value': r_value,
-                    'diode_reversed': diode_reversed,
-                    'vin_peak': vin_peak,
-                    'vbias': None,
-                    'vbias_reversed': None,
-                    'vz': vz,
-                    'iz_max': iz_max,
-                    'iz_min': iz_min,
-                    'circuit_type': 'zener_diode3',
-                    'show_results': False,
-                    'results': None
-                })
-                st.rerun()
+        nav_panel()
 
 if __name__ == "__main__":
     main()
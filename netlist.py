@@ -0,0 +1,396 @@
+"""
+Circuit schematics, netlists and an ideal-diode modified nodal analysis solver.
+
+A Schematic is the declarative description of one circuit topology: the
+drawing steps CircuitDrawer turns into a schemdraw layout, each tagged with the
+netlist element it stands for, so the picture and the solver model come from
+the same definition.
+
+A Netlist is a tuple of two-terminal elements between named nodes ('0' is
+ground). Source, battery and capacitor values, and Zener voltages, may be
+parameter names instead of numbers, so one netlist covers every problem with
+the same topology and its factorizations are shared between them.
+
+Ideal diodes make the circuit piecewise linear: for each on/off state of the
+diodes the MNA system is linear, and its solution is an affine function of the
+parameters. NodalSolver factorizes each state once, keeps that affine map,
+and solves a whole sweep by checking which state is consistent at each point
+(conducting diodes carry forward current, blocking diodes are reverse biased).
+"""
+import hashlib
+import itertools
+from collections import namedtuple
+from dataclasses import dataclass
+
+import numpy as np
+
+GROUND = '0'
+
+# kind is one of
+#   'V'  voltage source or battery, pos is the + terminal
+#   'C'  capacitor, held at its charge V(pos) - V(neg) = value
+#   'R'  resistor
+#   'D'  diode, pos is the anode and value its DiodeModel (None for an ideal diode)
+#   'Z'  ideal Zener diode, pos is the anode and value is Vz
+Element = namedtuple('Element', 'kind name pos neg value')
+
+# One drawing step of a Schematic: a schemdraw element class placed from the
+# current position (optionally turned to `direction`), and the netlist Element
+# it stands for, None for wires and annotations. flip draws it reversed, dot
+# ends it with an open terminal and hold keeps the position where it started.
+# The shapes 'push' and 'pop' save and restore the position.
+Part = namedtuple(
+    'Part', 'shape direction label loc flip dot hold element',
+    defaults=(None, None, None, False, False, False, None)
+)
+
+OFF, ON, BREAKDOWN = 0, 1, 2
+
+THERMAL_VOLTAGE = 0.025852  # kT/q at 300 K, in V
+KNEE_CURRENT = 1.0  # mA; where a Shockley diode counts as turned on
+
+
+@dataclass(frozen=True, slots=True)
+class DiodeModel:
+    """
+    A practical diode, in V, mA and kΩ like the rest of the app. Without a
+    saturation current it is piecewise linear: off below v_on, then v_on plus
+    r_on times the current (r_on=0 is the constant-drop model). With one it
+    follows Shockley's equation i = Is * (exp(v / (n * Vt)) - 1), and v_on is
+    its voltage at KNEE_CURRENT.
+    """
+    v_on: float = 0.0
+    r_on: float = 0.0
+    saturation: float | None = None
+    emission: float = 1.0
+
+    @classmethod
+    def shockley(cls, saturation, emission=1.0):
+        v_on = emission * THERMAL_VOLTAGE * np.log1p(KNEE_CURRENT / saturation)
+        return cls(round(float(v_on), 6), 0.0, saturation, emission)
+
+
+def _topology_hash(items):
+    # repr rather than hash(): it is stable across processes and runs
+    return hashlib.blake2b(repr(items).encode(), digest_size=8).hexdigest()
+
+
+@dataclass(frozen=True, slots=True)
+class Netlist:
+    """Immutable element list; hashes by value so it can key caches"""
+    elements: tuple
+
+    def topology_hash(self):
+        """Stable digest of the elements, equal for every problem of a topology"""
+        return _topology_hash(self.elements)
+
+    @classmethod
+    def build(cls, *elements):
+        return cls(tuple(Element(*e) for e in elements))
+
+    def nodes(self):
+        """Every non-ground node, in order of first appearance"""
+        seen = {}
+        for e in self.elements:
+            for node in (e.pos, e.neg):
+                if node != GROUND:
+                    seen.setdefault(node)
+        return tuple(seen)
+
+    def parameters(self):
+        return tuple(sorted({e.value for e in self.elements if isinstance(e.value, str)}))
+
+    def diodes(self):
+        return tuple(e for e in self.elements if e.kind in 'DZ')
+
+    def with_values(self, **values):
+        """Copy with the named elements' values replaced, e.g. with_values(R=4.7)"""
+        return Netlist(tuple(e._replace(value=values[e.name]) if e.name in values else e for e in self.elements))
+
+
+@dataclass(frozen=True, slots=True)
+class Schematic:
+    """
+    Drawing steps of one topology. Labels carry @slot@ markers instead of
+    numbers, so a schematic (and its layout) is shared by every problem drawn
+    from it.
+    """
+    parts: tuple
+
+    def netlist(self):
+        return Netlist(tuple(p.element for p in self.parts if p.element is not None))
+
+    def topology_hash(self):
+        """Stable digest of the drawing steps, for keying rendered layouts"""
+        return _topology_hash(self.parts)
+
+
+class _StateSystem:
+    """
+    Affine solution of one diode state. Rows of `nodes` and `constraints` are
+    dotted with [1, *parameters]; the state is consistent where every
+    constraint row is >= 0.
+    """
+    __slots__ = ('matrix', 'nodes', 'constraints')
+
+    def __init__(self, matrix, nodes, constraints):
+        self.matrix = matrix
+        self.nodes = nodes
+        self.constraints = constraints
+
+
+class NodalSolver:
+    """
+    Solve a Netlist for any number of parameter points at once. Each diode
+    state is factorized the first time it is needed and kept, so a sweep over
+    thousands of points costs a few matrix-vector products per state.
+    """
+    TOLERANCE = 1e-9  # Relative slack on the consistency checks, for round-off
+
+    def __init__(self, netlist):
+        self.netlist = netlist
+        self.nodes = netlist.nodes()
+        self.parameters = netlist.parameters()
+        self.diodes = netlist.diodes()
+        self.states = list(itertools.product(*((OFF, ON) if d.kind == 'D' else (OFF, ON, BREAKDOWN) for d in self.diodes)))
+        self._node_index = {node: i for i, node in enumerate(self.nodes)}
+        self._systems = {}
+
+    def _column(self, value):
+        """Row vector over [1, *parameters] for an element value"""
+        row = np.zeros(1 + len(self.parameters))
+        if isinstance(value, str):
+            row[1 + self.parameters.index(value)] = 1
+        else:
+            row[0] = value
+        return row
+
+    @staticmethod
+    def _turn_on(diode):
+        """(voltage, series resistance) of a conducting diode's piecewise-linear model"""
+        if diode.kind == 'D' and diode.value is not None:
+            return diode.value.v_on, diode.value.r_on
+        return 0.0, 0.0
+
+    def _voltage_row(self, node, x):
+        return np.zeros(x.shape[1]) if node == GROUND else x[self._node_index[node]]
+
+    def system(self, state):
+        """_StateSystem for a diode state, or None if the state makes the circuit singular"""
+        if state in self._systems:
+            return self._systems[state]
+
+        # Branches V(pos) - V(neg) - r * i = value, with the branch current i flowing pos -> neg
+        branches = []
+        for e in self.netlist.elements:
+            if e.kind in 'VC':
+                branches.append((e.pos, e.neg, e.value, 0.0))
+        for d, s in zip(self.diodes, state):
+            if s == ON:
+                branches.append((d.pos, d.neg, *self._turn_on(d)))
+            elif s == BREAKDOWN:
+                branches.append((d.neg, d.pos, d.value, 0.0))
+
+        n = len(self.nodes)
+        size = n + len(branches)
+        a = np.zeros((size, size))
+        b = np.zeros((size, 1 + len(self.parameters)))
+        for e in self.netlist.elements:
+            if e.kind == 'R':
+                g = 1.0 / e.value
+                for p, q in ((e.pos, e.neg), (e.neg, e.pos)):
+                    if p != GROUND:
+                        a[self._node_index[p], self._node_index[p]] += g
+                        if q != GROUND:
+                            a[self._node_index[p], self._node_index[q]] -= g
+        for k, (p, q, value, r) in enumerate(branches):
+            for node, sign in ((p, 1), (q, -1)):
+                if node != GROUND:
+                    a[self._node_index[node], n + k] += sign
+                    a[n + k, self._node_index[node]] += sign
+            a[n + k, n + k] = -r
+            b[n + k] = self._column(value)
+
+        # A conducting diode across a source (or a node nothing holds) has no solution
+        if np.linalg.cond(a) > 1e12:
+            self._systems[state] = None
+            return None
+        # Round off solver noise so exact answers stay exact (slope 1, offset 0, ...)
+        x = np.round(np.linalg.solve(a, b), 12)
+
+        constraints = []
+        conducting = iter(range(n + len(branches) - sum(s != OFF for s in state), size))
+        for d, s in zip(self.diodes, state):
+            v_ak = self._voltage_row(d.pos, x) - self._voltage_row(d.neg, x)
+            if s == OFF:
+                constraints.append(self._column(self._turn_on(d)[0]) - v_ak)
+                if d.kind == 'Z':
+                    constraints.append(self._column(d.value) + v_ak)
+            else:
+                constraints.append(x[next(conducting)])
+        system = _StateSystem(a, x[:n], np.array(constraints).reshape(len(constraints), x.shape[1]))
+        self._systems[state] = system
+        return system
+
+    def _points(self, values):
+        missing = [p for p in self.parameters if p not in values]
+        if missing:
+            raise ValueError(f"Missing netlist parameters: {', '.join(missing)}")
+        columns = np.broadcast_arrays(*(np.asarray(values[p], dtype=float) for p in self.parameters))
+        shape = columns[0].shape if columns else ()
+        points = np.stack([np.ones(int(np.prod(shape)))] + [c.ravel() for c in columns])
+        return points, shape
+
+    def solve(self, **values):
+        """
+        Solve at every point of the (broadcast) parameter arrays. Where several
+        states are consistent, as at a diode's switching point, the first one in
+        self.states wins (so a diode at exactly 0 V counts as off).
+        """
+        points, shape = self._points(values)
+        count = points.shape[1]
+        state = np.full(count, -1)
+        voltages = np.full((len(self.nodes), count), np.nan)
+        tolerance = self.TOLERANCE * (1 + np.abs(points).max(axis=0))
+
+        for index, s in enumerate(self.states):
+            todo = np.flatnonzero(state < 0)
+            if not len(todo):
+                break
+            system = self.system(s)
+            if system is None:
+                continue
+            sub = points[:, todo]
+            ok = (system.constraints @ sub >= -tolerance[todo]).all(axis=0)
+            state[todo[ok]] = index
+            voltages[:, todo[ok]] = system.nodes @ sub[:, ok]
+        return NodalSolution(self, state.reshape(shape), voltages.reshape((len(self.nodes),) + shape))
+
+    def solve_shockley(self, iterations=50, **values):
+        """
+        solve() for a netlist with one Shockley diode. The rest of the circuit is
+        linear, so the diode sees a Thevenin source Vth (its open-circuit voltage,
+        from the all-off state) behind Rth, and its voltage solves
+        v + Rth * Is * (exp(v / nVt) - 1) = Vth. That is solved by Newton's method
+        for every point at once, starting above the root so the steps never
+        overshoot into overflow. A diode counts as conducting past its knee.
+        """
+        (diode,) = self.diodes
+        model = diode.value
+        points, shape = self._points(values)
+        off = self.system(self.states[0])
+        vth = (self._voltage_row(diode.pos, off.nodes) - self._voltage_row(diode.neg, off.nodes)) @ points
+
+        # Node voltages fall by `response` per mA of diode current
+        injection = np.zeros(len(off.matrix))
+        for node, sign in ((diode.pos, -1), (diode.neg, 1)):
+            if node != GROUND:
+                injection[self._node_index[node]] = sign
+        response = -np.linalg.solve(off.matrix, injection)[:len(self.nodes)]
+        rth = self._voltage_row(diode.pos, response[:, None])[0] - self._voltage_row(diode.neg, response[:, None])[0]
+
+        nvt = model.emission * THERMAL_VOLTAGE
+        if rth <= 0:
+            # Held straight across a source (a clamper's charged capacitor): no current to solve for
+            v, current = vth, np.zeros_like(vth)
+        else:
+            # v <= Vth, and Rth * Is * (exp(v / nVt) - 1) <= Vth bounds it again without overflow
+            v = np.minimum(np.maximum(vth, 0), nvt * np.log1p(np.maximum(vth, 0) / (rth * model.saturation)))
+            for _ in range(iterations):
+                grow = model.saturation * np.expm1(v / nvt)
+                step = (v + rth * grow - vth) / (1 + rth * (grow + model.saturation) / nvt)
+                v = v - step
+                if np.all(np.abs(step) < 1e-12):
+                    break
+            current = model.saturation * np.expm1(v / nvt)
+
+        voltages = off.nodes @ points - response[:, None] * current
+        tolerance = self.TOLERANCE * (1 + np.abs(points).max(axis=0))
+        state = (v > model.v_on + tolerance).astype(int)
+        return NodalSolution(self, state.reshape(shape), voltages.reshape((len(self.nodes),) + shape))
+
+    def piece(self, node, sweep, **values):
+        """
+        (state, slope, offset) of V(node) against parameter `sweep` around the
+        scalar point `values`, i.e. V(node) = slope * values[sweep] + offset there.
+        """
+        index = int(self.solve(**values).state)
+        if index < 0:
+            raise ValueError("No consistent diode state")
+        state = self.states[index]
+        row = self._voltage_row(node, self.system(state).nodes)
+        column = 1 + self.parameters.index(sweep)
+        point, _ = self._points(values)
+        slope = row[column]
+        return state, slope, float(row @ point[:, 0]) - slope * float(values[sweep])
+
+    def breakpoints(self, sweep, **values):
+        """
+        Every value of `sweep` where some state's consistency can change, with the
+        other parameters fixed at `values`. A superset of the switching points.
+        """
+        values = dict(values, **{sweep: 0.0})
+        point, _ = self._points(values)
+        column = 1 + self.parameters.index(sweep)
+        found = set()
+        for s in self.states:
+            system = self.system(s)
+            if system is None:
+                continue
+            for row in system.constraints:
+                if row[column] != 0:
+                    found.add(float(-(row @ point[:, 0]) / row[column]))
+        return sorted(found)
+
+    def blocking_bound(self, param, **values):
+        """
+        The single diode's blocking condition as a bound on one parameter:
+        (bound, lower), meaning it blocks while param >= bound if lower, else
+        while param <= bound. E.g. a clamper's capacitor charge against Vin(t).
+        """
+        (row,) = self.system(self.states[0]).constraints
+        points, shape = self._points(dict(values, **{param: 0.0}))
+        coefficient = row[1 + self.parameters.index(param)]
+        return (-(row @ points) / coefficient).reshape(shape), bool(coefficient > 0)
+
+    def settle(self, param, **values):
+        """
+        Charge `param` (a capacitor value) settles to, starting from zero, once
+        it has charged through the diodes until none of them conducts at any of
+        the points in `values`, e.g. a clamper's input at both peaks.
+        """
+        values = dict(values, **{param: 0.0})
+        points, _ = self._points(values)
+        system = self.system(self.states[0])  # All diodes off
+        column = 1 + self.parameters.index(param)
+        charge = 0.0
+        for row in system.constraints:
+            if row[column] == 0:
+                continue
+            # Only points where a diode would conduct at zero charge move it
+            for slack in row @ points:
+                need = -slack / row[column]
+                if slack < 0 and abs(need) > abs(charge):
+                    charge = float(need)
+        return charge
+
+
+class NodalSolution:
+    """Per-point diode states and node voltages from NodalSolver.solve"""
+    __slots__ = ('solver', 'state', 'voltages')
+
+    def __init__(self, solver, state, voltages):
+        self.solver = solver
+        self.state = state
+        self.voltages = voltages
+
+    def voltage(self, node):
+        if node == GROUND:
+            return np.zeros(self.state.shape)
+        return self.voltages[self.solver.nodes.index(node)]
+
+    def conducting(self, diode):
+        """True where the named diode conducts, forward or in breakdown"""
+        i = next(i for i, d in enumerate(self.solver.diodes) if d.name == diode)
+        table = np.array([s[i] != OFF for s in self.solver.states] + [False])
+        return table[self.state]
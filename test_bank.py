@@ -0,0 +1,41 @@
+import dataclasses
+import random
+
+import numpy as np
+import pytest
+
+from bank import ProblemBank, build_bank
+from engine import CIRCUIT_TYPES, TRANSFER_CIRCUITS, solve_problem
+
+
+@pytest.fixture(scope='module')
+def bank(tmp_path_factory):
+    path = tmp_path_factory.mktemp('bank') / 'problems.bank'
+    assert build_bank(path, 2, workers=2, seed=0) == 2 * len(CIRCUIT_TYPES)
+    bank = ProblemBank(path)
+    yield bank
+    bank.close()
+
+
+@pytest.mark.parametrize('circuit_type', CIRCUIT_TYPES)
+def test_bank_round_trip(bank, circuit_type):
+    assert bank.count(circuit_type) == 2
+    problem = bank.random_problem(circuit_type, random.Random(0))
+    assert bytes(bank.svg(problem)).startswith(b'<svg')
+
+    expected = solve_problem(problem)
+    answers = bank.answers(problem)
+    if circuit_type in TRANSFER_CIRCUITS:
+        assert answers[0] == expected[0]
+        np.testing.assert_array_equal(answers[1], expected[1])
+        np.testing.assert_array_equal(answers[2], expected[2])
+    else:
+        np.testing.assert_allclose(answers[1:], [v for v in expected[1:] if v is not None])
+
+
+def test_bank_ignores_problems_it_did_not_store(bank):
+    problem = bank.random_problem('series_clipper', random.Random(0))
+    changed = dataclasses.replace(problem, vin_peak=problem.vin_peak + 1)
+    assert bank.svg(changed) is None
+    assert bank.answers(changed) is None
+    assert bank.svg(dataclasses.replace(problem, seed=None)) is None
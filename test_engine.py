@@ -0,0 +1,194 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from engine import (
+    CIRCUIT_TYPES, DIODE_MODELS, TRANSFER_CIRCUITS, Problem, ProblemPrefetcher, SvgStore, _clamped_recurrence,
+    calculate_correct_values, calculate_correct_values_batch, generate_problem, minify_svg, simulate_clamper,
+    table_vins, transfer_function
+)
+
+
+def test_minify_svg_keeps_hex_colours():
+    svg = (b'<svg xmlns="http://www.w3.org/2000/svg">'
+           b'<path d="M 0.123 4.56" style="stroke:#000000;fill:#1e90ff;stroke-width:2.04"/></svg>')
+    out = minify_svg(svg)
+    assert b'stroke:#000000' in out
+    assert b'fill:#1e90ff' in out
+    assert b'stroke-width:2' in out
+    assert b'd="M 0.1 4.6"' in out
+
+
+def _naive_recurrence(a, b, g, y0, lower):
+    pick = max if lower else min
+    y = []
+    for bn, gn in zip(b, g):
+        y0 = pick(a * y0 + bn, gn)
+        y.append(y0)
+    return np.array(y)
+
+
+@pytest.mark.parametrize('a', [0.0, 0.5, 1 - 1e-17])
+@pytest.mark.parametrize('lower', [True, False])
+def test_clamped_recurrence_matches_per_sample_loop(a, lower):
+    rng = np.random.default_rng(0)
+    b = rng.normal(size=2000)
+    g = rng.normal(size=2000) * 3
+    expected = _naive_recurrence(a, b, g, 0.5, lower)
+    np.testing.assert_allclose(_clamped_recurrence(a, b, g, 0.5, lower), expected, atol=1e-9)
+
+
+def test_simulate_clamper_without_discharge():
+    problem = generate_problem('bias_clamper', 1)
+    _, _, vo = simulate_clamper(problem, 1e9, 1e9)
+    assert np.isfinite(vo).all()
+
+
+@pytest.mark.parametrize('vbias_reversed, level', [(False, 3.0), (True, -3.0)])
+def test_series_biasclipper_switches_at_vbias(vbias_reversed, level):
+    tf = transfer_function('series_biasclipper', False, 3.0, vbias_reversed, 10.0)
+    np.testing.assert_array_equal(tf.switch_points(), [level])
+    # Vo = Vin - level once the diode conducts; below that the output is clipped at 0
+    np.testing.assert_array_equal(tf.inverse(1.0), [level + 1.0])
+    assert len(tf.inverse(0.0)) == 0
+
+
+def test_inverse_skips_clipped_pieces():
+    tf = transfer_function('parallel_biasclipper', False, 3.0, False, 10.0)
+    np.testing.assert_array_equal(tf.switch_points(), [3.0])
+    np.testing.assert_array_equal(tf.inverse(-2.0), [-2.0])
+    assert len(tf.inverse(5.0)) == 0
+
+
+@pytest.mark.parametrize('circuit_type', CIRCUIT_TYPES)
+def test_problem_bytes_round_trip(circuit_type):
+    for seed in (0, 1, 2**64 - 1):
+        problem = generate_problem(circuit_type, seed)
+        data = problem.to_bytes()
+        assert len(data) == Problem._PACKED.size
+        assert Problem.from_bytes(data) == problem
+    unseeded = Problem(circuit_type, 5.0, False, 1.0)
+    assert Problem.from_bytes(unseeded.to_bytes()) == unseeded
+
+
+@pytest.mark.parametrize('circuit_type', CIRCUIT_TYPES)
+def test_seed_reproduces_problem(circuit_type):
+    assert generate_problem(circuit_type, 42) == generate_problem(circuit_type, 42)
+    assert generate_problem(circuit_type, 42).seed == 42
+
+
+class _FlakyDrawer:
+    """Fails its first draw the way a broken render pool would"""
+    def __init__(self):
+        self.calls = 0
+
+    def draw_problem(self, problem):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("pool broke")
+        return b'<svg/>'
+
+
+def test_prefetcher_survives_render_errors():
+    drawer = _FlakyDrawer()
+    prefetcher = ProblemPrefetcher(drawer, depth=1, circuit_types=('series_clipper',))
+    try:
+        deadline = time.monotonic() + 5
+        while drawer.calls < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        problem, svg = prefetcher.take('series_clipper')
+        assert problem.circuit_type == 'series_clipper' and svg == b'<svg/>'
+        # The refill take() asked for still happens on the same thread
+        while prefetcher.pending('series_clipper') < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert prefetcher.pending('series_clipper') == 1
+        assert prefetcher._thread.is_alive()
+    finally:
+        prefetcher.close()
+
+
+def test_svg_store_keeps_files_untouched_and_prunes_least_recently_used(tmp_path):
+    store = SvgStore(str(tmp_path), '/app/static/svg', limit=2)
+    names = {}
+    for i, svg in enumerate((b'<svg>a</svg>', b'<svg>b</svg>')):
+        names[svg] = store.publish(svg).rsplit('/', 1)[1]
+        os.utime(tmp_path / names[svg], (1000 + i, 1000 + i))
+
+    # Using a again doesn't change what the server sends as its ETag
+    store.publish(b'<svg>a</svg>')
+    assert os.path.getmtime(tmp_path / names[b'<svg>a</svg>']) == 1000
+    store.publish(b'<svg>c</svg>')
+    store.prune()
+    assert (tmp_path / names[b'<svg>a</svg>']).exists()
+    assert not (tmp_path / names[b'<svg>b</svg>']).exists()
+
+    # Deleted behind its back (e.g. by another process), a drawing is written again
+    os.remove(tmp_path / names[b'<svg>a</svg>'])
+    store.publish(b'<svg>a</svg>')
+    assert (tmp_path / names[b'<svg>a</svg>']).exists()
+
+
+@pytest.mark.parametrize('circuit_type, vbias, vbias_reversed, vin_peak', [
+    ('nobias_clamper', None, None, None),
+    ('bias_clamper', 3.0, False, None),
+    ('series_biasclipper', None, None, 10.0),
+    ('series_biasclipper', 3.0, None, 10.0),
+    ('parallel_biasclipper', None, False, 10.0),
+    ('parallel_biasclipper', 3.0, None, 10.0),
+])
+def test_missing_inputs_fall_back_to_zero(circuit_type, vbias, vbias_reversed, vin_peak):
+    for vin in (-5.0, 0.0, 5.0):
+        assert calculate_correct_values(vin, False, circuit_type, vbias, vbias_reversed, vin_peak) == (False, 0.0)
+
+
+@pytest.mark.parametrize('circuit_type', ['zener_diode1', 'zener_diode2', 'zener_diode3'])
+def test_zener_without_vz_falls_back_to_zero(circuit_type):
+    result = calculate_correct_values(10.0, True, circuit_type, vin_peak=10.0, r_value=1.0)
+    assert result[0] is False and not any(result[1:])
+
+
+# Answer key rows the nodal solver changed on purpose ("was" gives the old
+# hand-written value), next to rows either side of them that stayed the same
+@pytest.mark.parametrize('vin, args, expected', [
+    # Series bias clipper, forward diode, reversed bias: Vo = Vin + Vbias
+    (5.0, (False, 'series_biasclipper', 3.0, True, 10.0), (True, 8.0)),  # was 5
+    (-1.0, (False, 'series_biasclipper', 3.0, True, 10.0), (True, 2.0)),
+    # Parallel bias clipper below its clipping level: Vo = Vin
+    (1.0, (False, 'parallel_biasclipper', 3.0, False, 10.0), (False, 1.0)),  # was 0
+    (-5.0, (False, 'parallel_biasclipper', 3.0, False, 10.0), (False, -5.0)),
+    # Bias clampers whose bias is past the input peak never charge: Vo = Vin
+    (5.0, (False, 'bias_clamper', 8.0, False, 5.0), (False, 5.0)),  # was 8
+    (-5.0, (True, 'bias_clamper', 8.0, True, 5.0), (False, -5.0)),  # was -8
+    # A diode at exactly 0 V is off in every circuit
+    (0.0, (True, 'parallel_clipper'), (False, 0.0)),  # was on
+    (0.0, (False, 'series_clipper'), (False, 0.0)),
+    (3.0, (False, 'series_biasclipper', 3.0, False, 10.0), (False, 0.0)),
+    (5.0, (False, 'nobias_clamper', None, None, 5.0), (False, 0.0)),
+])
+def test_answer_key_changes(vin, args, expected):
+    assert calculate_correct_values(vin, *args) == expected
+
+
+@pytest.mark.parametrize('circuit_type', TRANSFER_CIRCUITS)
+def test_batch_matches_scalar(circuit_type):
+    for seed in range(20):
+        problem = generate_problem(circuit_type, seed)
+        args = (problem.diode_reversed, circuit_type, problem.vbias, problem.vbias_reversed, problem.vin_peak)
+        tf = transfer_function(circuit_type, *args[:1], *args[2:])
+        # Table rows, every breakpoint and either side of it
+        bps = tf.breakpoints
+        vins = np.concatenate([table_vins(problem.vin_peak), bps, bps + 1e-3, bps - 1e-3])
+        fb, vo = calculate_correct_values_batch(vins, *args)
+        for vin, batch_fb, batch_vo in zip(vins, fb, vo):
+            assert calculate_correct_values(float(vin), *args) == (bool(batch_fb), float(batch_vo))
+
+
+@pytest.mark.parametrize('model', ['constant', 'pwl', 'shockley'])
+def test_practical_models_need_r_value(model):
+    args = ([1.0, 10.0], False, 'parallel_biasclipper', 3.0, False, 10.0)
+    with pytest.raises(ValueError):
+        calculate_correct_values_batch(*args, diode_model=DIODE_MODELS[model])
+    fb, vo = calculate_correct_values_batch(*args, diode_model=DIODE_MODELS[model], r_value=2.2)
+    assert not fb[0] and fb[1] and 3.0 < vo[1] < 4.0
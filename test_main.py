@@ -0,0 +1,37 @@
+import math
+
+import pytest
+
+from main import parse_engineering_notation, to_engineering_notation, to_engineering_notation_array
+
+
+@pytest.mark.parametrize('text, unit, value', [
+    ('4.7k', '', 4700.0),
+    ('12m', '', 0.012),
+    ('330u', '', 330e-6),
+    ('330μA', 'A', 330e-6),
+    ('500.00mV', 'V', 0.5),
+    ('-2.5 V', 'V', -2.5),
+    ('1e3', '', 1000.0),
+])
+def test_parse_engineering_notation(text, unit, value):
+    assert parse_engineering_notation(text, unit) == value
+
+
+@pytest.mark.parametrize('text', ['5A', '4.7kV', 'abc', '4.7x', ''])
+def test_parse_engineering_notation_rejects(text):
+    with pytest.raises(ValueError):
+        parse_engineering_notation(text, 'Ω')
+
+
+@pytest.mark.parametrize('value', [0.0, 4700.0, 0.012, 330e-6, -2.5, 12.34e3, 1.5e-9, 2.2e9, 999.99])
+def test_engineering_notation_round_trips(value):
+    text = to_engineering_notation(value, 'V')
+    assert parse_engineering_notation(text, 'V') == value
+    assert to_engineering_notation(parse_engineering_notation(text, 'V'), 'V') == text
+
+
+def test_engineering_notation_array_matches_scalar():
+    values = [0.0, -0.0, 1e-12, 0.00099, 0.5, 1.0, 999.995, 1000.0, -4700.0, 1e12, math.inf]
+    assert to_engineering_notation_array(values, 'V') == [to_engineering_notation(v, 'V') for v in values]
+    assert to_engineering_notation_array([0.0, 2.0], ['V', 'A']) == ['0 V', '2A']
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from netlist import THERMAL_VOLTAGE, DiodeModel, Netlist, NodalSolver
+
+
+def rectifier(model=None, r=1.0):
+    return NodalSolver(Netlist.build(
+        ('V', 'Vin', 'in', '0', 'vin'), ('D', 'D', 'in', 'out', model), ('R', 'R', 'out', '0', r)
+    ))
+
+
+def test_resistive_divider():
+    solver = NodalSolver(Netlist.build(
+        ('V', 'Vin', 'in', '0', 'vin'), ('R', 'R1', 'in', 'out', 1.0), ('R', 'R2', 'out', '0', 3.0)
+    ))
+    np.testing.assert_allclose(solver.solve(vin=np.array([-4.0, 2.0])).voltage('out'), [-3.0, 1.5])
+
+
+def test_ideal_rectifier():
+    solver = rectifier()
+    solution = solver.solve(vin=np.array([-5.0, 0.0, 5.0]))
+    np.testing.assert_array_equal(solution.voltage('out'), [0.0, 0.0, 5.0])
+    # A diode at exactly 0 V counts as off
+    np.testing.assert_array_equal(solution.conducting('D'), [False, False, True])
+    assert solver.breakpoints('vin') == [0.0]
+    (state,), slope, offset = solver.piece('out', 'vin', vin=5.0)
+    assert state and slope == 1.0 and offset == 0.0
+
+
+def test_zener_regulator():
+    solver = NodalSolver(Netlist.build(
+        ('V', 'Vin', 'in', '0', 'vin'), ('R', 'R', 'in', 'out', 1.0), ('Z', 'Z', '0', 'out', 5.0)
+    ))
+    solution = solver.solve(vin=np.array([-10.0, 3.0, 10.0]))
+    np.testing.assert_array_equal(solution.voltage('out'), [0.0, 3.0, 5.0])
+    np.testing.assert_array_equal(solution.conducting('Z'), [True, False, True])
+
+
+def test_practical_diode_drops_its_turn_on_voltage():
+    solution = rectifier(DiodeModel(0.7)).solve(vin=np.array([0.5, 5.0]))
+    np.testing.assert_allclose(solution.voltage('out'), [0.0, 4.3])
+    solution = rectifier(DiodeModel(0.6, 0.1)).solve(vin=np.array([2.0]))
+    np.testing.assert_allclose(solution.voltage('out'), [1.4 / 1.1])
+
+
+def test_shockley_solve_satisfies_kcl():
+    model = DiodeModel.shockley(1e-11)
+    vin = np.array([-5.0, 0.5, 5.0])
+    solution = rectifier(model, r=2.0).solve_shockley(vin=vin)
+    vo = solution.voltage('out')
+    current = model.saturation * np.expm1((vin - vo) / THERMAL_VOLTAGE)
+    np.testing.assert_allclose(vo / 2.0, current, atol=1e-9)
+    np.testing.assert_array_equal(solution.conducting('D'), [False, False, True])
+
+
+def test_clamper_capacitor_settles_at_the_peak():
+    solver = NodalSolver(Netlist.build(
+        ('V', 'Vin', 'in', '0', 'vin'), ('C', 'C', 'in', 'out', 'vc'),
+        ('R', 'R', 'out', '0', 1.0), ('D', 'D', 'out', '0', None)
+    ))
+    assert solver.settle('vc', vin=np.array([5.0, -5.0])) == 5.0
+    bound, lower = solver.blocking_bound('vc', vin=np.array([5.0, -5.0]))
+    np.testing.assert_array_equal(bound, [5.0, -5.0])
+    assert lower
+
+
+def test_missing_parameters():
+    with pytest.raises(ValueError):
+        rectifier().solve()